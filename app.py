@@ -5,18 +5,37 @@ Flask Web API para YouTube Downloader
 Conecta la interfaz web con el script de descarga existente
 """
 
+import atexit
 import os
 import sys
 import json
 import uuid
 import threading
+import time
+import glob
+import hmac
+import re
+import shutil
+import socket
 import subprocess
-from datetime import datetime
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from concurrent.futures import as_completed
+from contextlib import contextmanager
+from flask import Flask, Response, abort, request, jsonify, render_template, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
 import yt_dlp
+from yt_dlp.utils import DownloadCancelled, parse_bytes
 from pathlib import Path
 
+from bandwidth import BandwidthScheduler
+from extraction_cache import ExtractionCacheStats, ytdlp_cache_dir
+from job_store import TERMINAL_STATUSES, JobStore, ProgressRegistry
+from library_index import LibraryIndex
+from metadata_cache import MetadataCache, playlist_cache_key, video_cache_key
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from scheduler import DownloadScheduler, QueueFullError, StagePool
+from transfer_tuning import MB, FRAGMENT_LEVELS, TransferTuner
+from ydl_pool import YoutubeDLPools
+
 # Importar funciones del script existente
 try:
     import yt_dlp
@@ -27,32 +46,239 @@ except ImportError:
 app = Flask(__name__)
 CORS(app)
 
+# Detrás de nginx/apache: delegar el envío de archivos con X-Sendfile
+app.config['USE_X_SENDFILE'] = os.environ.get('YTD_USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
 # Configuración
 DOWNLOADS_FOLDER = os.path.join(os.getcwd(), 'downloads')
 FFMPEG_PATH = os.path.join(os.getcwd(), 'ffmpeg-8.0-essentials_build', 'bin')
 
+# Límites del planificador de descargas
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get('YTD_MAX_WORKERS', 3))
+MAX_QUEUED_DOWNLOADS = int(os.environ.get('YTD_MAX_QUEUE', 100))
+# Por defecto un host puede ocupar todos los trabajadores: casi todo viene de YouTube
+MAX_DOWNLOADS_PER_HOST = int(os.environ.get('YTD_MAX_PER_HOST', MAX_CONCURRENT_DOWNLOADS))
+
+# Conversiones con ffmpeg (CPU) en un pool propio, separado de las descargas (red)
+POSTPROCESS_WORKERS = int(os.environ.get('YTD_POSTPROCESS_WORKERS', os.cpu_count() or 2))
+
+# Conexiones por descarga: fragmentos DASH/HLS en paralelo y tamaño de chunk HTTP,
+# ajustados según el rendimiento observado; YTD_MAX_CONNECTIONS es el total entre todas
+MAX_CONNECTIONS = int(os.environ.get('YTD_MAX_CONNECTIONS', 16))
+MAX_FRAGMENTS_PER_JOB = int(os.environ.get('YTD_MAX_FRAGMENTS', 8))
+INITIAL_FRAGMENTS = int(os.environ.get('YTD_INITIAL_FRAGMENTS', 4))
+CHUNK_TARGET_SECONDS = float(os.environ.get('YTD_CHUNK_TARGET_SECONDS', 4))
+
+# Ancho de banda total entre todas las descargas (bytes/s, admite '20M'; vacío o 0 sin tope)
+# y peso de cada clase de tráfico al repartirlo: el audio pesa más para terminar antes
+BANDWIDTH_LIMIT = parse_bytes(os.environ.get('YTD_BANDWIDTH_LIMIT') or '0') or 0
+BANDWIDTH_WEIGHTS = {
+    'audio': float(os.environ.get('YTD_BANDWIDTH_WEIGHT_AUDIO', 4)),
+    'video': float(os.environ.get('YTD_BANDWIDTH_WEIGHT_VIDEO', 1)),
+}
+
+# Token para los endpoints /api/admin (vacío: solo consulta, los cambios quedan deshabilitados)
+ADMIN_TOKEN = os.environ.get('YTD_ADMIN_TOKEN', '')
+
+# Modo de audio 'fast': códecs que se entregan sin recodificar a MP3 (solo copia o remux)
+AUDIO_MODES = ('mp3', 'fast')
+FAST_AUDIO_CODECS = [codec.strip().lower() for codec in
+                     os.environ.get('YTD_FAST_AUDIO_CODECS', 'mp4a,opus,mp3').split(',') if codec.strip()]
+
+# Contenedor de audio de cada familia de códec al copiar el stream
+AUDIO_CODEC_EXTENSIONS = {'mp4a': 'm4a', 'aac': 'm4a', 'opus': 'opus', 'mp3': 'mp3', 'vorbis': 'ogg', 'flac': 'flac'}
+
+# Caché de metadatos para /api/analyze
+INFO_CACHE_SIZE = int(os.environ.get('YTD_INFO_CACHE_SIZE', 256))
+INFO_CACHE_TTL = int(os.environ.get('YTD_INFO_CACHE_TTL', 600))
+INFO_CACHE_NEGATIVE_TTL = int(os.environ.get('YTD_INFO_CACHE_NEGATIVE_TTL', 30))
+
+# Análisis por lotes: extracciones simultáneas y URLs por petición
+ANALYZE_CONCURRENCY = int(os.environ.get('YTD_ANALYZE_CONCURRENCY', 8))
+ANALYZE_BATCH_MAX = int(os.environ.get('YTD_ANALYZE_BATCH_MAX', 200))
+
+# Envío de descargas por lotes (manifiestos NDJSON): trabajos por lote y cola
+# total permitida al encolarlos (puede superar YTD_MAX_QUEUE)
+BATCH_MAX_JOBS = int(os.environ.get('YTD_BATCH_MAX_JOBS', 5000))
+BATCH_MAX_QUEUE = int(os.environ.get('YTD_BATCH_MAX_QUEUE', 10000))
+
+# Stream de progreso (Server-Sent Events)
+SSE_MIN_INTERVAL = float(os.environ.get('YTD_SSE_MIN_INTERVAL', 0.25))
+SSE_KEEPALIVE = float(os.environ.get('YTD_SSE_KEEPALIVE', 15))
+
+# Instancias de YoutubeDL reutilizables por perfil de opciones
+YDL_POOL_SIZE = int(os.environ.get('YTD_YDL_POOL_SIZE', 4))
+
+# Caché de yt-dlp (player JS, firmas, nsig) compartido con el CLI, y video
+# con el que se precalienta al arrancar (vacío para desactivar)
+YTDLP_CACHE_DIR = ytdlp_cache_dir()
+CACHE_WARMUP_URL = os.environ.get('YTD_CACHE_WARMUP_URL', 'https://www.youtube.com/watch?v=jNQXAC9IVRw')
+
+# Entradas de una misma playlist descargando a la vez (dentro de los límites del planificador)
+PLAYLIST_CONCURRENCY = int(os.environ.get('YTD_PLAYLIST_CONCURRENCY', 4))
+
+# Historial de descargas: base SQLite, retención y entradas en memoria.
+# Vive en data/, fuera de los archivos que se sirven por HTTP
+JOBS_DB_PATH = os.environ.get('YTD_JOBS_DB', os.path.join(os.getcwd(), 'data', 'jobs.db'))
+JOB_RETENTION_DAYS = float(os.environ.get('YTD_JOB_RETENTION_DAYS', 7))
+JOB_RETENTION_MAX = int(os.environ.get('YTD_JOB_RETENTION_MAX', 5000))
+MAX_HOT_JOBS = int(os.environ.get('YTD_MAX_HOT_JOBS', 500))
+
+# Índice de la biblioteca: reescaneo completo como máximo cada N segundos
+LIBRARY_RESCAN_INTERVAL = float(os.environ.get('YTD_LIBRARY_RESCAN_INTERVAL', 300))
+# Separación mínima entre reescaneos por cambios en la carpeta (las descargas la tocan sin parar)
+LIBRARY_MIN_RESCAN_INTERVAL = float(os.environ.get('YTD_LIBRARY_MIN_RESCAN_INTERVAL', 2))
+
+# Reanudar al arrancar las descargas que un reinicio dejó a medias
+RESUME_JOBS = os.environ.get('YTD_RESUME_JOBS', '1').lower() not in ('0', 'false', 'no')
+
+# Modo multiproceso (gunicorn -w N, sin --preload): progreso, dueño y cancelaciones
+# de cada descarga se comparten por la base SQLite, así cualquier worker responde
+# por cualquier descarga. Los límites de cola y concurrencia siguen siendo por worker.
+MULTIPROCESS = os.environ.get('YTD_MULTIPROCESS', '0').lower() in ('1', 'true', 'yes')
+SHARED_SYNC_INTERVAL = float(os.environ.get('YTD_SHARED_SYNC_INTERVAL', 0.5))
+WORKER_STALE_AFTER = float(os.environ.get('YTD_WORKER_STALE_AFTER', 15))
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# Intervalo mínimo entre actualizaciones del hook de progreso (segundos)
+PROGRESS_MIN_INTERVAL = float(os.environ.get('YTD_PROGRESS_INTERVAL', 0.2))
+
 # Asegurar que existe la carpeta de descargas
 os.makedirs(DOWNLOADS_FOLDER, exist_ok=True)
 
-# Almacenamiento en memoria para el progreso de descargas
-download_progress = {}
+# Progreso de descargas: entradas recientes en memoria, historial en SQLite
+os.makedirs(os.path.dirname(os.path.abspath(JOBS_DB_PATH)), exist_ok=True)
+job_store = JobStore(JOBS_DB_PATH, max_age_days=JOB_RETENTION_DAYS, max_jobs=JOB_RETENTION_MAX)
+download_progress = ProgressRegistry(job_store, max_hot=MAX_HOT_JOBS, owner=WORKER_ID)
 active_downloads = {}
 
+# Descargas en curso por contenido (video, formato, calidad, playlist, carpeta) -> download_id
+job_keys = {}
+job_keys_lock = threading.Lock()
+
+scheduler = DownloadScheduler(
+    max_workers=MAX_CONCURRENT_DOWNLOADS,
+    max_queue=MAX_QUEUED_DOWNLOADS,
+    per_host_limit=MAX_DOWNLOADS_PER_HOST,
+)
+
+postprocess_pool = StagePool('postprocess', POSTPROCESS_WORKERS)
+
+analyze_pool = StagePool('analyze', ANALYZE_CONCURRENCY)
+
+bandwidth = BandwidthScheduler(limit=BANDWIDTH_LIMIT, class_weights=BANDWIDTH_WEIGHTS)
+
+transfer_tuner = TransferTuner(
+    max_connections=MAX_CONNECTIONS,
+    max_fragments=MAX_FRAGMENTS_PER_JOB,
+    initial_fragments=INITIAL_FRAGMENTS,
+    chunk_seconds=CHUNK_TARGET_SECONDS,
+)
+
+library_index = LibraryIndex(DOWNLOADS_FOLDER, rescan_interval=LIBRARY_RESCAN_INTERVAL,
+                             min_rescan_interval=LIBRARY_MIN_RESCAN_INTERVAL)
+
+info_cache = MetadataCache(
+    maxsize=INFO_CACHE_SIZE,
+    ttl=INFO_CACHE_TTL,
+    negative_ttl=INFO_CACHE_NEGATIVE_TTL,
+)
+
+# Opciones base de cada perfil; las propias de cada petición se aplican al prestar la instancia
+extraction_cache_stats = ExtractionCacheStats()
+ydl_pools = YoutubeDLPools(on_create=extraction_cache_stats.instrument)
+ydl_pools.register('analyze', {
+    'quiet': True,
+    'no_warnings': True,
+    'socket_timeout': 30,
+    'retries': 3,
+    'extract_flat': False,
+    'ignoreerrors': False,
+    'noplaylist': True,  # Por defecto no descargar playlist completa
+    'ffmpeg_location': FFMPEG_PATH,
+    'cachedir': YTDLP_CACHE_DIR,
+}, max_size=max(YDL_POOL_SIZE, ANALYZE_CONCURRENCY))
+ydl_pools.register('playlist', {
+    'quiet': True,
+    'no_warnings': True,
+    'socket_timeout': 30,
+    'retries': 3,
+    'extract_flat': 'in_playlist',
+    'ignoreerrors': True,
+    'noplaylist': False,
+    'cachedir': YTDLP_CACHE_DIR,
+}, max_size=YDL_POOL_SIZE)
+ydl_pools.register('audio', {
+    'format': 'bestaudio/best',
+    'noplaylist': True,  # watch?v=X&list=Y: solo el video; las playlists descargan cada entrada por separado
+    'ffmpeg_location': FFMPEG_PATH,
+    'cachedir': YTDLP_CACHE_DIR,
+}, max_size=YDL_POOL_SIZE)
+ydl_pools.register('video', {
+    'format': 'best',
+    'noplaylist': True,
+    'ffmpeg_location': FFMPEG_PATH,
+    'cachedir': YTDLP_CACHE_DIR,
+}, max_size=YDL_POOL_SIZE)
+
+# Métricas para /metrics (formato de texto de Prometheus)
+metrics = MetricsRegistry()
+job_phase_seconds = metrics.histogram(
+    'ytd_job_phase_seconds', 'Tiempo por fase de cada video (queue, extraction, download, postprocess)', ('phase',))
+postprocessor_seconds = metrics.histogram(
+    'ytd_postprocessor_seconds', 'Duración de cada postprocesador según sus hooks', ('postprocessor',))
+jobs_finished = metrics.counter('ytd_jobs_finished_total', 'Videos terminados por resultado', ('outcome',))
+job_failures = metrics.counter('ytd_job_failures_total', 'Descargas fallidas por causa', ('cause',))
+downloaded_bytes = metrics.counter('ytd_downloaded_bytes_total', 'Bytes descargados por yt-dlp')
+transfer_fragments = metrics.histogram(
+    'ytd_transfer_fragments', 'Fragmentos en paralelo asignados a cada descarga', buckets=FRAGMENT_LEVELS)
+transfer_chunk_bytes = metrics.histogram(
+    'ytd_transfer_chunk_bytes', 'Tamaño de chunk HTTP asignado a cada descarga',
+    buckets=tuple(size * MB for size in (1, 2, 4, 8, 16, 32, 64)))
+transfer_throughput = metrics.histogram(
+    'ytd_transfer_throughput_bytes_per_second', 'Rendimiento observado de cada descarga',
+    buckets=tuple(size * MB for size in (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250)))
+metrics.gauge('ytd_transfer_connections_in_use', 'Conexiones reservadas por descargas en curso',
+              callback=lambda: transfer_tuner.in_use)
+metrics.gauge('ytd_transfer_connection_budget', 'Conexiones simultáneas permitidas entre todas las descargas',
+              callback=lambda: transfer_tuner.max_connections)
+metrics.gauge('ytd_bandwidth_limit_bytes_per_second', 'Tope de ancho de banda compartido (0: sin tope)',
+              callback=lambda: bandwidth.limit)
+metrics.gauge('ytd_bandwidth_waiting', 'Lecturas esperando turno en el limitador de ancho de banda',
+              callback=bandwidth.waiting)
+metrics.counter('ytd_bandwidth_throttled_seconds_total', 'Tiempo que las descargas esperaron por el tope',
+                callback=lambda: bandwidth.throttled_seconds)
+metrics.gauge('ytd_jobs_active', 'Descargas en ejecución', callback=lambda: scheduler.stats()['running'])
+metrics.gauge('ytd_jobs_queued', 'Descargas en cola', callback=lambda: scheduler.stats()['queued'])
+metrics.gauge('ytd_jobs_max_workers', 'Descargas simultáneas permitidas', callback=lambda: scheduler.max_workers)
+metrics.gauge('ytd_postprocess_running', 'Conversiones con ffmpeg en ejecución',
+              callback=lambda: postprocess_pool.stats()['running'])
+metrics.gauge('ytd_postprocess_queued', 'Conversiones esperando un hilo del pool de CPU',
+              callback=lambda: postprocess_pool.stats()['queued'])
+metrics.counter(
+    'ytd_info_cache_lookups_total', 'Consultas al caché de metadatos por resultado', ('result',),
+    callback=lambda: {key: value for key, value in info_cache.stats().items()
+                      if key in ('hits', 'negative_hits', 'misses', 'collapsed')})
+metrics.gauge('ytd_info_cache_hit_ratio', 'Proporción de aciertos del caché de metadatos',
+              callback=lambda: info_cache.stats()['hit_rate'])
+metrics.counter(
+    'ytd_ytdlp_cache_loads_total', 'Lecturas del caché de yt-dlp (player, firmas, nsig) por resultado', ('result',),
+    callback=lambda: {'hit': extraction_cache_stats.loads_hit, 'miss': extraction_cache_stats.loads_miss})
+metrics.counter(
+    'ytd_ydl_pool_checkouts_total', 'Préstamos de instancias YoutubeDL por pool', ('pool',),
+    callback=lambda: {name: stats['checkouts'] for name, stats in ydl_pools.stats().items()})
+metrics.counter(
+    'ytd_ydl_pool_reused_total', 'Préstamos servidos con una instancia ya creada', ('pool',),
+    callback=lambda: {name: stats['reused'] for name, stats in ydl_pools.stats().items()})
+
 def get_video_info(url):
+    """Obtener información del video (cacheada por ID de video)"""
+    return info_cache.get_or_load(video_cache_key(url), lambda: extract_video_info(url))
+
+def extract_video_info(url):
     """Obtener información del video usando yt-dlp sin interacción del usuario"""
     try:
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'socket_timeout': 30,
-            'retries': 3,
-            'extract_flat': False,
-            'ignoreerrors': False,
-            'noplaylist': True,  # Por defecto no descargar playlist completa
-            'ffmpeg_location': FFMPEG_PATH,
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with ydl_pools['analyze'].checkout() as ydl, extraction_cache_stats.measure():
             info = ydl.extract_info(url, download=False)
             return info
             
@@ -60,147 +286,785 @@ def get_video_info(url):
         print(f"Error al obtener información: {e}")
         return None
 
-def download_audio_api(url, quality, progress_callback=None, target_folder=None):
-    """Descargar audio usando yt-dlp para la API"""
+def warm_up():
+    """Precalentar los pools y el caché de player/firmas con una extracción"""
+    ydl_pools.warm()
+    if CACHE_WARMUP_URL:
+        if extract_video_info(CACHE_WARMUP_URL):
+            print(f"🔥 Caché de yt-dlp precalentado en: {YTDLP_CACHE_DIR}")
+
+def get_playlist_info(url):
+    """Obtener las entradas de una playlist sin extraer cada video (cacheado)"""
+    return info_cache.get_or_load(('playlist', playlist_cache_key(url) or url),
+                                  lambda: extract_playlist_info(url))
+
+def extract_playlist_info(url):
+    """Listar una playlist con extract_flat: solo IDs y títulos, sin formatos"""
     try:
-        # Usar carpeta especificada o la por defecto
-        download_folder = target_folder if target_folder else DOWNLOADS_FOLDER
-        
-        # Configurar opciones de descarga de audio
+        with ydl_pools['playlist'].checkout() as ydl:
+            info = ydl.extract_info(url, download=False)
+            if info and info.get('_type') == 'playlist':
+                info['entries'] = [entry for entry in (info.get('entries') or []) if entry]
+            return info
+            
+    except Exception as e:
+        print(f"Error al obtener la playlist: {e}")
+        return None
+
+def playlist_entry_url(entry):
+    """URL descargable de una entrada plana de playlist"""
+    url = entry.get('url') or entry.get('webpage_url')
+    if url and '://' in url:
+        return url
+    return f"https://www.youtube.com/watch?v={entry.get('id') or url}"
+
+def ffmpeg_executable():
+    """Ruta del binario de ffmpeg: la copia local si existe, si no la del sistema"""
+    for name in ('ffmpeg.exe', 'ffmpeg'):
+        candidate = os.path.join(FFMPEG_PATH, name)
+        if os.path.isfile(candidate):
+            return candidate
+    return shutil.which('ffmpeg') or 'ffmpeg'
+
+def run_ffmpeg(args, progress=None):
+    """Ejecutar ffmpeg registrando el proceso en el progreso para poder cancelarlo"""
+    cmd = [ffmpeg_executable(), '-y', '-loglevel', 'error', *args]
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, text=True)
+    if progress:
+        progress.attach_process(process)
+    try:
+        _, stderr = process.communicate()
+    finally:
+        if progress:
+            progress.attach_process(None)
+
+    if progress:
+        progress.check_cancelled()
+    if process.returncode != 0:
+        lines = (stderr or '').strip().splitlines()
+        raise RuntimeError(f"ffmpeg falló: {lines[-1] if lines else process.returncode}")
+
+def mp3_quality_args(quality):
+    """Argumentos de calidad para libmp3lame (como FFmpegExtractAudio)"""
+    try:
+        bitrate = float(quality)
+    except (TypeError, ValueError):
+        return []
+    return ['-b:a', f'{bitrate:g}k'] if bitrate > 10 else ['-q:a', f'{10 - bitrate:g}']
+
+def convert_audio_outputs(path, outputs, progress=None, postprocessor='FFmpegExtractAudio'):
+    """Generar una o más salidas de audio en una sola pasada de ffmpeg y borrar el original.
+
+    outputs es una lista de (ruta_final, argumentos_de_códec); el audio se
+    decodifica una sola vez y se reparte a todas las salidas.
+    """
+    temps = [f'{base}.temp{ext}' for base, ext in (os.path.splitext(new_path) for new_path, _ in outputs)]
+    args = ['-i', path]
+    for (_, codec_args), temp_path in zip(outputs, temps):
+        args += ['-map', '0:a:0', *codec_args, temp_path]
+    try:
+        if progress:
+            progress.postprocess_update({'status': 'started', 'postprocessor': postprocessor})
+        run_ffmpeg(args, progress)
+        for (new_path, _), temp_path in zip(outputs, temps):
+            os.replace(temp_path, new_path)
+        if progress:
+            progress.postprocess_update({'status': 'finished', 'postprocessor': postprocessor})
+    finally:
+        for temp_path in temps:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    os.remove(path)
+    return [new_path for new_path, _ in outputs]
+
+def convert_audio(path, ext, codec_args, progress=None, postprocessor='FFmpegExtractAudio', base=None):
+    """Extraer el audio con ffmpeg a base.ext (por defecto junto al original) y borrar el original"""
+    new_path = f'{base or os.path.splitext(path)[0]}.{ext}'
+    return convert_audio_outputs(path, [(new_path, codec_args)], progress, postprocessor)[0]
+
+def move_output(path, base=None):
+    """Mover un archivo ya listo a base + su extensión"""
+    if not base:
+        return path
+    new_path = base + os.path.splitext(path)[1]
+    os.replace(path, new_path)
+    return new_path
+
+def transcode_to_mp3(path, quality, progress=None, base=None):
+    """Convertir el archivo descargado a MP3 y borrar el original"""
+    if path.lower().endswith('.mp3'):
+        return move_output(path, base)
+    return convert_audio(path, 'mp3', ['-acodec', 'libmp3lame', *mp3_quality_args(quality)], progress, base=base)
+
+def mp3_quality_label(quality):
+    """Sufijo del archivo para cada calidad: '192' -> '192k', '2' (VBR) -> 'V2'"""
+    try:
+        bitrate = float(quality)
+    except (TypeError, ValueError):
+        return str(quality)
+    return f'{bitrate:g}k' if bitrate > 10 else f'V{10 - bitrate:g}'
+
+def transcode_to_mp3_multi(path, qualities, progress=None, base=None):
+    """Codificar varias calidades de MP3 desde un único decodificado; devuelve las rutas"""
+    base = base or os.path.splitext(path)[0]
+    outputs = [(f'{base} [{mp3_quality_label(quality)}].mp3', ['-acodec', 'libmp3lame', *mp3_quality_args(quality)])
+               for quality in qualities]
+    return convert_audio_outputs(path, outputs, progress)
+
+def remux_audio(path, acodec, progress=None, base=None):
+    """Copiar el stream de audio (sin recodificar) a su contenedor natural"""
+    ext = AUDIO_CODEC_EXTENSIONS[audio_codec_family(acodec)]
+    return convert_audio(path, ext, ['-c:a', 'copy'], progress, postprocessor='FFmpegRemuxAudio', base=base)
+
+def audio_codec_family(acodec):
+    """'mp4a.40.2' -> 'mp4a'"""
+    return (acodec or '').split('.')[0].strip().lower()
+
+def fast_audio_format():
+    """Mejor audio con un códec permitido; si no hay ninguno, el mejor audio (se convertirá)"""
+    codecs = '|'.join(re.escape(codec) for codec in FAST_AUDIO_CODECS)
+    return f"bestaudio[acodec~='^({codecs})']/bestaudio/best"
+
+def audio_action(path, acodec, audio_mode):
+    """Qué hacer con el audio descargado: 'copy', 'remux' o 'transcode' (a MP3)"""
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if audio_mode != 'fast':
+        return 'copy' if ext == 'mp3' else 'transcode'
+    family = audio_codec_family(acodec)
+    target = AUDIO_CODEC_EXTENSIONS.get(family)
+    if family not in FAST_AUDIO_CODECS or not target:
+        return 'transcode'
+    return 'copy' if ext == target else 'remux'
+
+def job_work_dir(download_folder, progress=None):
+    """Carpeta oculta de trabajo de una descarga (.part, fragmentos, intermedios).
+
+    Lleva el download_id: dos descargas del mismo video nunca comparten
+    archivos a medias y una descarga reanudada encuentra los suyos.
+    """
+    return os.path.join(download_folder, f'.ytd-{progress.download_id if progress else uuid.uuid4().hex}')
+
+def quality_suffix(quality, label):
+    """Sufijo del nombre final por calidad (' [720p]'); la mejor calidad no lleva"""
+    return '' if quality == 'best' else f' [{label(quality)}]'
+
+def downloaded_filepath(ydl, info):
+    """Ruta final del archivo descargado por yt-dlp"""
+    requested = info.get('requested_downloads') or [{}]
+    return requested[0].get('filepath') or ydl.prepare_filename(info)
+
+def downloaded_acodec(info):
+    """Códec de audio del formato descargado"""
+    requested = info.get('requested_downloads') or [{}]
+    return requested[0].get('acodec') or info.get('acodec')
+
+@contextmanager
+def planned_transfer(url, progress=None, traffic_class=''):
+    """Reservar conexiones para una descarga y publicar los ajustes elegidos.
+
+    Devuelve el TransferPlan: sus opciones van a yt-dlp y su hook mide el
+    rendimiento, que el tuner usa para la siguiente descarga del mismo host
+    y tipo de tráfico.
+    """
+    plan = transfer_tuner.plan(url, traffic_class)
+    transfer_fragments.observe(plan.fragments)
+    transfer_chunk_bytes.observe(plan.chunk_size)
+    if progress:
+        progress.transfer = plan
+    try:
+        yield plan
+    finally:
+        throughput = transfer_tuner.finish(plan)
+        if throughput:
+            transfer_throughput.observe(throughput)
+
+@contextmanager
+def bandwidth_lease(progress, traffic_class):
+    """Registrar la descarga en el limitador de ancho de banda mientras dura la etapa de red"""
+    job_id = progress.download_id if progress else uuid.uuid4().hex
+    parent = progress.parent if progress else None
+    lease = bandwidth.lease(job_id, traffic_class,
+                            group=parent.download_id if parent is not None else None,
+                            cancel_event=progress.cancel_event if progress else None)
+    try:
+        yield lease
+    finally:
+        bandwidth.release(lease)
+
+def download_audio_api(url, quality, progress_callback=None, target_folder=None, progress=None,
+                       on_fetched=None, audio_mode='mp3'):
+    """Descargar audio usando yt-dlp para la API; devuelve la ruta del archivo.
+
+    audio_mode 'mp3' convierte siempre a MP3; 'fast' elige el mejor audio con
+    un códec de FAST_AUDIO_CODECS y solo lo copia o remuxa (la calidad pedida
+    se ignora). La acción tomada queda en progress.audio_action.
+    Si quality es una lista se genera un MP3 por calidad en una sola pasada
+    de ffmpeg y se devuelve la lista de rutas.
+    on_fetched se llama al terminar la etapa de red, antes de pasar la
+    conversión al pool de CPU (postprocess_pool).
+    """
+    # Usar carpeta especificada o la por defecto
+    download_folder = target_folder if target_folder else DOWNLOADS_FOLDER
+    work_dir = job_work_dir(download_folder, progress)
+    try:
+        # Configurar opciones de descarga de audio; la conversión a MP3 la hace
+        # transcode_to_mp3 para poder terminar ffmpeg si se cancela la descarga.
+        # El original se baja a la carpeta de trabajo y solo la salida final
+        # llega a download_folder
         ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': os.path.join(download_folder, '%(title)s.%(ext)s'),
-            'ffmpeg_location': FFMPEG_PATH,
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': quality,
-            }],
+            'outtmpl': os.path.join(work_dir, '%(title)s.%(ext)s'),
             'progress_hooks': [progress_callback] if progress_callback else [],
+            'postprocessor_hooks': [progress.postprocess_update] if progress else [],
         }
+        if audio_mode == 'fast':
+            ydl_opts['format'] = fast_audio_format()
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-            return True
+        # Las conexiones se devuelven al terminar la red, antes de convertir
+        with planned_transfer(url, progress, 'audio') as plan, bandwidth_lease(progress, 'audio') as lease:
+            ydl_opts.update(plan.ydl_opts())
+            ydl_opts['progress_hooks'] += [plan.hook, lease.hook]
+            with ydl_pools['audio'].checkout(**ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=True)
+                source_path = downloaded_filepath(ydl, info)
+        
+        multiple = isinstance(quality, list)
+        action = 'transcode' if multiple else audio_action(source_path, downloaded_acodec(info), audio_mode)
+        if progress:
+            progress.audio_action = action
+        if on_fetched:
+            on_fetched()
+        base = os.path.join(download_folder, os.path.splitext(os.path.basename(source_path))[0])
+        try:
+            if action == 'copy':
+                return move_output(source_path, base)
+            if action == 'remux':
+                return postprocess_pool.run(remux_audio, source_path, downloaded_acodec(info), progress, base)
+            if multiple:
+                return postprocess_pool.run(transcode_to_mp3_multi, source_path, quality, progress, base)
+            base += quality_suffix(quality, mp3_quality_label)
+            return postprocess_pool.run(transcode_to_mp3, source_path, quality, progress, base)
+        except DownloadCancelled:
+            if os.path.exists(source_path):
+                os.remove(source_path)
+            raise
             
     except Exception as e:
         print(f"Error al descargar audio: {e}")
-        return False
+        return None
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
-def download_video_api(url, quality, progress_callback=None, target_folder=None):
-    """Descargar video usando yt-dlp para la API"""
+def download_video_api(url, quality, progress_callback=None, target_folder=None, progress=None):
+    """Descargar video usando yt-dlp para la API; devuelve la ruta del archivo"""
+    # Usar carpeta especificada o la por defecto
+    download_folder = target_folder if target_folder else DOWNLOADS_FOLDER
+    work_dir = job_work_dir(download_folder, progress)
     try:
-        # Usar carpeta especificada o la por defecto
-        download_folder = target_folder if target_folder else DOWNLOADS_FOLDER
-        
         # Configurar opciones de descarga de video
         if quality == 'best':
             video_format = 'best'
         else:
             video_format = f'best[height<={quality}]/best'
-            
+        
+        # Los .part e intermedios van a la carpeta de trabajo; yt-dlp mueve el
+        # resultado a download_folder con un nombre distinto por calidad
         ydl_opts = {
             'format': video_format,
-            'outtmpl': os.path.join(download_folder, '%(title)s.%(ext)s'),
-            'ffmpeg_location': FFMPEG_PATH,
+            'paths': {'home': download_folder, 'temp': work_dir},
+            'outtmpl': f"%(title)s{quality_suffix(quality, lambda height: f'{height}p')}.%(ext)s",
             'progress_hooks': [progress_callback] if progress_callback else [],
+            'postprocessor_hooks': [progress.postprocess_update] if progress else [],
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-            return True
+        with planned_transfer(url, progress, 'video') as plan, bandwidth_lease(progress, 'video') as lease:
+            ydl_opts.update(plan.ydl_opts())
+            ydl_opts['progress_hooks'] += [plan.hook, lease.hook]
+            with ydl_pools['video'].checkout(**ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=True)
+                return downloaded_filepath(ydl, info)
             
     except Exception as e:
         print(f"Error al descargar video: {e}")
-        return False
+        return None
+    
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def cleanup_partial_files(progress):
+    """Borrar archivos .part, fragmentos y .ytdl que dejó una descarga interrumpida"""
+    for filename in progress.partial_files:
+        patterns = (glob.escape(filename) + '.part*', glob.escape(filename) + '.ytdl')
+        for pattern in patterns:
+            for path in glob.glob(pattern):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"⚠️  No se pudo borrar {path}: {e}")
 
 class DownloadProgress:
+    # __slots__ evita el dict por instancia y abarata los accesos en el hook
+    __slots__ = (
+        'download_id', 'status', 'status_text', 'filename', 'filepath', 'error', 'completed',
+        'downloaded_bytes', 'total_bytes', 'speed_bps', 'eta_seconds', 'fixed_percentage',
+        'version', '_changed', '_last_update',
+        'cancel_event', 'process', 'partial_files', 'parent', 'job_key', 'request',
+        'phase', 'phase_started', 'phase_times', 'pp_started',
+        'audio_mode', 'audio_action', 'files', 'transfer',
+    )
+
     def __init__(self, download_id):
         self.download_id = download_id
-        self.status = 'starting'
-        self.percentage = 0
-        self.speed = None
-        self.eta = None
+        self.status = 'queued'
+        self.status_text = 'En cola...'
         self.filename = None
+        self.filepath = None
         self.error = None
-        self.status_text = 'Iniciando descarga...'
         self.completed = False
 
+        # Contadores crudos; el texto se formatea en to_dict()
+        self.downloaded_bytes = 0
+        self.total_bytes = None
+        self.speed_bps = None
+        self.eta_seconds = None
+        self.fixed_percentage = 0
+
+        self.version = 0
+        self._changed = threading.Condition()
+        self._last_update = 0.0
+
+        # Cancelación cooperativa: el hook y run_ffmpeg revisan cancel_event
+        self.cancel_event = threading.Event()
+        self.process = None
+        self.partial_files = set()
+
+        # Progreso agregado (playlist) al que se notifican los cambios
+        self.parent = None
+        self.job_key = None
+
+        # Parámetros de la petición original, para reanudar tras un reinicio
+        self.request = None
+
+        # Modo de audio pedido y camino tomado: 'copy', 'remux' o 'transcode'
+        self.audio_mode = None
+        self.audio_action = None
+
+        # Todas las salidas cuando se piden varias calidades (filepath es la primera)
+        self.files = None
+
+        # TransferPlan de la descarga: fragmentos, chunk y rendimiento medido
+        self.transfer = None
+
+        # Tiempo acumulado por fase para /metrics; se publica al terminar
+        self.phase = 'queue'
+        self.phase_started = time.monotonic()
+        self.phase_times = {}
+        self.pp_started = None
+
+    @property
+    def percentage(self):
+        if not self.fixed_percentage and self.total_bytes:
+            return (self.downloaded_bytes / self.total_bytes) * 100
+        return self.fixed_percentage
+
+    def _touch(self):
+        """Registrar un cambio y despertar a los streams que esperan"""
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+        if self.parent is not None:
+            self.parent._touch()
+
+    def wait_for_change(self, version, timeout):
+        """Esperar hasta que la versión cambie o venza el timeout; devuelve la versión actual"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """Pedir la cancelación y terminar el proceso de ffmpeg en curso"""
+        self.cancel_event.set()
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.terminate()
+        self.set_error('Descarga cancelada por el usuario')
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise DownloadCancelled('Descarga cancelada por el usuario')
+
+    def attach_process(self, process):
+        """Registrar el subproceso activo (o None al terminar)"""
+        self.process = process
+        if process is not None and self.cancel_event.is_set():
+            process.terminate()
+
+    def start(self):
+        """Marcar que un trabajador tomó la descarga de la cola"""
+        self.status = 'starting'
+        self.status_text = 'Iniciando descarga...'
+        self._enter_phase('extraction')
+        self._touch()
+
+    def _enter_phase(self, phase):
+        """Cerrar la fase actual sumando su duración y empezar la siguiente"""
+        now = time.monotonic()
+        if self.phase is not None:
+            self.phase_times[self.phase] = self.phase_times.get(self.phase, 0.0) + now - self.phase_started
+        self.phase = phase
+        self.phase_started = now
+
+    def _publish_phases(self):
+        for phase, seconds in self.phase_times.items():
+            job_phase_seconds.observe(seconds, phase=phase)
+        self.phase_times = {}
+
+    def _record_finish(self, outcome):
+        """Publicar tiempos por fase y resultado (una sola vez por descarga)"""
+        failed_phase = self.phase
+        if failed_phase is None:
+            return
+        self._enter_phase(None)
+        self._publish_phases()
+        jobs_finished.inc(outcome=outcome)
+        if outcome != 'completed':
+            job_failures.inc(cause='cancelled' if outcome == 'cancelled' else failed_phase)
+
     def update(self, d):
         """Callback para yt-dlp progress hook"""
-        if d['status'] == 'downloading':
-            self.status = 'downloading'
-            self.status_text = 'Descargando...'
-            
-            # Calcular porcentaje
-            if 'total_bytes' in d and d['total_bytes']:
-                self.percentage = (d['downloaded_bytes'] / d['total_bytes']) * 100
-            elif 'total_bytes_estimate' in d and d['total_bytes_estimate']:
-                self.percentage = (d['downloaded_bytes'] / d['total_bytes_estimate']) * 100
-            
-            # Velocidad de descarga
-            if 'speed' in d and d['speed']:
-                speed_kbps = d['speed'] / 1024
-                if speed_kbps > 1024:
-                    self.speed = f"{speed_kbps/1024:.1f} MB/s"
-                else:
-                    self.speed = f"{speed_kbps:.1f} KB/s"
-            
-            # Tiempo estimado
-            if 'eta' in d and d['eta']:
-                eta_minutes = d['eta'] // 60
-                eta_seconds = d['eta'] % 60
-                self.eta = f"{eta_minutes:02d}:{eta_seconds:02d}"
-                
-        elif d['status'] == 'finished':
+        if self.cancel_event.is_set():
+            # El .part ya existe: anotarlo para que cleanup_partial_files lo borre
+            if d.get('filename'):
+                self.partial_files.add(d['filename'])
+            raise DownloadCancelled('Descarga cancelada por el usuario')
+
+        status = d['status']
+        if status == 'downloading':
+            # yt-dlp llama al hook por cada bloque: agrupar a PROGRESS_MIN_INTERVAL
+            now = time.monotonic()
+            if now - self._last_update < PROGRESS_MIN_INTERVAL and self.status == 'downloading':
+                return
+            self._last_update = now
+
+            if self.status != 'downloading':
+                self.status = 'downloading'
+                self.status_text = 'Descargando...'
+                self.fixed_percentage = 0
+                self.partial_files.add(d.get('filename'))
+                if self.phase != 'download':
+                    self._enter_phase('download')
+                    download_progress.persist(self)
+
+            self.downloaded_bytes = d.get('downloaded_bytes') or 0
+            self.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate') or self.total_bytes
+            self.speed_bps = d.get('speed') or self.speed_bps
+            self.eta_seconds = d.get('eta') or self.eta_seconds
+
+        elif status == 'finished':
             self.status = 'processing'
             self.status_text = 'Procesando archivo...'
-            self.percentage = 95
+            self.fixed_percentage = 95
             self.filename = os.path.basename(d['filename'])
-            
-        elif d['status'] == 'error':
+            downloaded_bytes.inc(d.get('total_bytes') or d.get('downloaded_bytes') or 0)
+            self._enter_phase('postprocess')
+            download_progress.persist(self)
+
+        elif status == 'error':
             self.status = 'error'
             self.error = str(d.get('error', 'Error desconocido'))
             self.status_text = f'Error: {self.error}'
 
-    def complete(self, filename=None):
+        self._touch()
+
+    def postprocess_update(self, d):
+        """Callback para los postprocessor hooks de yt-dlp (y la conversión a MP3)"""
+        if self.cancel_event.is_set():
+            raise DownloadCancelled('Descarga cancelada por el usuario')
+
+        if d['status'] == 'started':
+            self.pp_started = time.monotonic()
+            if self.phase not in ('postprocess', None):
+                self._enter_phase('postprocess')
+        elif d['status'] == 'finished' and self.pp_started is not None:
+            postprocessor_seconds.observe(time.monotonic() - self.pp_started,
+                                          postprocessor=d.get('postprocessor') or 'desconocido')
+            self.pp_started = None
+
+    def complete(self, filepath=None):
         """Marcar descarga como completada"""
         self.status = 'completed'
         self.status_text = 'Descarga completada'
-        self.percentage = 100
+        self.fixed_percentage = 100
         self.completed = True
-        if filename:
-            self.filename = filename
+        if filepath:
+            self.filepath = filepath
+            self.filename = os.path.basename(filepath)
+        self._record_finish('completed')
+        self._touch()
 
     def set_error(self, error_msg):
         """Marcar descarga como error"""
         self.status = 'error'
         self.error = error_msg
         self.status_text = f'Error: {error_msg}'
+        self._record_finish('cancelled' if self.cancel_event.is_set() else 'error')
+        self._touch()
 
     def to_dict(self):
         """Convertir a diccionario para JSON"""
+        speed = None
+        if self.speed_bps:
+            speed_kbps = self.speed_bps / 1024
+            if speed_kbps > 1024:
+                speed = f"{speed_kbps/1024:.1f} MB/s"
+            else:
+                speed = f"{speed_kbps:.1f} KB/s"
+
+        eta = None
+        if self.eta_seconds:
+            eta_minutes, eta_seconds = divmod(int(self.eta_seconds), 60)
+            eta = f"{eta_minutes:02d}:{eta_seconds:02d}"
+
         return {
             'status': self.status,
             'percentage': self.percentage,
-            'speed': self.speed,
-            'eta': self.eta,
+            'speed': speed,
+            'eta': eta,
             'filename': self.filename,
             'error': self.error,
             'status_text': self.status_text,
-            'completed': self.completed
+            'completed': self.completed,
+            'file_url': f'/api/files/{self.download_id}' if self.completed and self.filepath else None,
+            'audio_mode': self.audio_mode,
+            'audio_action': self.audio_action,
+            'transfer': self.transfer.to_dict() if self.transfer else None,
+            'files': [{
+                'filename': os.path.basename(path),
+                'file_url': f'/api/files/{self.download_id}/{index}',
+            } for index, path in enumerate(self.files)] if self.completed and self.files else None
         }
 
+    def to_record(self):
+        """Estado para guardar en el JobStore"""
+        record = self.to_dict()
+        record['download_id'] = self.download_id
+        record['filepath'] = self.filepath
+        record['filepaths'] = self.files
+        record['job_key'] = self.job_key
+        record['request'] = self.request
+        record['parent_id'] = self.parent.download_id if self.parent is not None else None
+        return record
+
+class PlaylistProgress(DownloadProgress):
+    """Progreso agregado de una playlist: cada entrada tiene su propio DownloadProgress"""
+    __slots__ = ('title', 'children', 'resume_ids')
+
+    def __init__(self, download_id):
+        super().__init__(download_id)
+        self.title = None
+        self.children = []
+        # IDs de las entradas antes del reinicio, en orden, para conservarlos
+        self.resume_ids = []
+
+    def start(self):
+        super().start()
+        # La playlist solo mide su espera en cola; cada entrada mide sus propias fases
+        self._enter_phase(None)
+        self._publish_phases()
+
+    def add_entry(self, title=None):
+        """Crear y registrar el progreso de una entrada"""
+        child = DownloadProgress(self.resume_ids.pop(0) if self.resume_ids else str(uuid.uuid4()))
+        child.filename = title
+        child.parent = self
+        child.audio_mode = self.audio_mode
+        if self.cancel_event.is_set():
+            child.cancel_event.set()
+        self.children.append(child)
+        download_progress[child.download_id] = child
+        return child
+
+    @property
+    def percentage(self):
+        if self.completed or not self.children:
+            return self.fixed_percentage
+        return sum(child.percentage for child in self.children) / len(self.children)
+
+    def counts(self):
+        done = sum(1 for child in self.children if child.completed)
+        failed = sum(1 for child in self.children if child.status == 'error')
+        return done, failed
+
+    def cancel(self):
+        """Cancelar la playlist y todas sus entradas"""
+        self.cancel_event.set()
+        for child in self.children:
+            if not child.completed and child.status != 'error':
+                child.cancel()
+        self.set_error('Descarga cancelada por el usuario')
+
+    def to_dict(self):
+        data = super().to_dict()
+        done, failed = self.counts()
+        data.update({
+            'is_playlist': True,
+            'title': self.title,
+            'total': len(self.children),
+            'done': done,
+            'failed': failed,
+            'entries': [{
+                'download_id': child.download_id,
+                'status': child.status,
+                'percentage': child.percentage,
+                'filename': child.filename,
+                'error': child.error,
+            } for child in self.children],
+        })
+        if self.status == 'downloading':
+            data['status_text'] = f'Descargando playlist ({done + failed}/{len(self.children)})...'
+        return data
+
+def mark_interrupted(record, error='Descarga interrumpida por reinicio del servidor', cause='interrupted'):
+    """Cerrar con error una descarga que no se puede reanudar"""
+    record.pop('cancel_requested', None)
+    record.update({
+        'status': 'error',
+        'error': error,
+        'status_text': f'Error: {error}',
+    })
+    job_store.save(record['download_id'], record)
+    job_failures.inc(cause=cause)
+
+def resume_interrupted_jobs():
+    """Volver a encolar las descargas que quedaron a medias al reiniciar.
+
+    Conservan su download_id y yt-dlp continúa desde los .part y fragmentos
+    que dejaron. Las entradas de una playlist se reanudan con ella; los
+    registros sin la petición original se marcan como interrumpidos.
+    Solo se toman, de forma atómica, las descargas cuyo worker ya no vive:
+    varios workers de gunicorn nunca reanudan la misma descarga.
+    """
+    job_store.heartbeat(WORKER_ID, os.getpid())
+    reap_dead_workers()
+    records = job_store.claim_orphans(WORKER_ID, WORKER_STALE_AFTER)
+    resumed = {}
+    for record in records:
+        if record.get('parent_id'):
+            continue
+        if record.get('cancel_requested'):
+            mark_interrupted(record, 'Descarga cancelada por el usuario', cause='cancelled')
+            continue
+        if RESUME_JOBS and record.get('request'):
+            try:
+                enqueue_resumed(record)
+                resumed[record['download_id']] = {entry['download_id'] for entry in record.get('entries') or []}
+                continue
+            except QueueFullError:
+                pass
+            except Exception as e:
+                print(f"⚠️  No se pudo reanudar {record['download_id']}: {e}")
+        mark_interrupted(record)
+    
+    # Entradas de playlists que no se reanudaron o que su playlist ya no conserva
+    for record in records:
+        parent_id = record.get('parent_id')
+        if parent_id and record['download_id'] not in resumed.get(parent_id, ()):
+            mark_interrupted(record)
+    job_store.prune()
+    if resumed:
+        print(f"♻️  {len(resumed)} descargas reanudadas tras el reinicio")
+
+def reap_dead_workers():
+    """Retirar los workers de esta máquina cuyo proceso ya no existe.
+
+    Así un reinicio tras una caída retoma sus descargas enseguida, sin
+    esperar a que el latido del proceso muerto caduque.
+    """
+    prefix = f"{socket.gethostname()}-"
+    for worker in job_store.workers():
+        if worker['owner'] == WORKER_ID or not worker['owner'].startswith(prefix):
+            continue
+        try:
+            os.kill(worker['pid'], 0)
+        except ProcessLookupError:
+            job_store.retire(worker['owner'])
+        except OSError:
+            pass
+
+def enqueue_resumed(record):
+    """Reconstruir el progreso de una descarga interrumpida y encolarla de nuevo"""
+    job_request = record['request']
+    download_id = record['download_id']
+    if job_request['playlist']:
+        progress = PlaylistProgress(download_id)
+        progress.resume_ids = [entry['download_id'] for entry in record.get('entries') or []]
+    else:
+        progress = DownloadProgress(download_id)
+    progress.job_key = record.get('job_key')
+    progress.audio_mode = record.get('audio_mode')
+    progress.filename = record.get('filename')
+    progress.status_text = 'En cola (reanudando tras reinicio)...'
+    enqueue_download(progress, job_request)
+
 @app.route('/')
 def index():
     """Servir la página principal"""
     return send_from_directory('.', 'index.html')
 
+# Únicos archivos de la raíz que se sirven: el resto (base de datos, caché,
+# código) no debe salir por HTTP
+STATIC_FILES = frozenset({'index.html', 'script.js', 'styles.css', 'favicon.ico'})
+
 @app.route('/<path:filename>')
 def serve_static(filename):
     """Servir archivos estáticos"""
+    if filename not in STATIC_FILES:
+        abort(404)
     return send_from_directory('.', filename)
 
+def analyze_url(url):
+    """Información resumida de un video o playlist para /api/analyze"""
+    # Si la URL trae una playlist (list=), listarla en modo plano
+    playlist = get_playlist_info(url) if playlist_cache_key(url) else None
+    if playlist and playlist.get('_type') != 'playlist':
+        playlist = None
+    
+    # Obtener información del video; una URL de playlist pura usa la lista plana
+    if playlist and video_cache_key(url) == playlist_cache_key(url):
+        info = playlist
+    else:
+        info = get_video_info(url)
+    
+    if not info:
+        return {
+            'success': False,
+            'error': 'No se pudo obtener información del video'
+        }
+    
+    # Detectar si es playlist basado en la información obtenida
+    is_playlist = playlist is not None or info.get('_type') == 'playlist'
+    playlist_count = len((playlist or info).get('entries') or []) if is_playlist else 0
+    
+    return {
+        'success': True,
+        'info': {
+            'title': info.get('title', 'Título no disponible'),
+            'uploader': info.get('uploader', 'Canal no disponible'),
+            'duration': info.get('duration', 0),
+            'view_count': info.get('view_count', 0),
+            'upload_date': info.get('upload_date', ''),
+            'thumbnail': info.get('thumbnail', ''),
+            'webpage_url': info.get('webpage_url', url),
+            'is_playlist': is_playlist,
+            'playlist_count': playlist_count
+        }
+    }
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_video():
     """Analizar URL de YouTube y obtener información del video"""
@@ -220,36 +1084,7 @@ def analyze_video():
                 'error': 'URL no proporcionada'
             })
         
-        # Obtener información del video/playlist directamente
-        info = get_video_info(url)
-        
-        if not info:
-            return jsonify({
-                'success': False,
-                'error': 'No se pudo obtener información del video'
-            })
-        
-        # Detectar si es playlist basado en la información obtenida
-        is_playlist = info.get('_type') == 'playlist'
-        playlist_count = len(info.get('entries', [])) if is_playlist else 0
-        
-        # Preparar respuesta
-        response_data = {
-            'success': True,
-            'info': {
-                'title': info.get('title', 'Título no disponible'),
-                'uploader': info.get('uploader', 'Canal no disponible'),
-                'duration': info.get('duration', 0),
-                'view_count': info.get('view_count', 0),
-                'upload_date': info.get('upload_date', ''),
-                'thumbnail': info.get('thumbnail', ''),
-                'webpage_url': info.get('webpage_url', url),
-                'is_playlist': is_playlist,
-                'playlist_count': playlist_count
-            }
-        }
-        
-        return jsonify(response_data)
+        return jsonify(analyze_url(url))
         
     except Exception as e:
         print(f"Error en analyze_video: {e}")
@@ -258,6 +1093,90 @@ def analyze_video():
             'error': f'Error al analizar el video: {str(e)}'
         })
 
+def parse_batch_urls(urls):
+    """Validar la lista de URLs de un análisis por lotes; devuelve (urls, error)"""
+    if not isinstance(urls, list):
+        return None, 'Se esperaba una lista de URLs en "urls"'
+    urls = [str(url).strip() for url in urls if str(url).strip()]
+    if not urls:
+        return None, 'URL no proporcionada'
+    if len(urls) > ANALYZE_BATCH_MAX:
+        return None, f'Demasiadas URLs: {len(urls)} (máximo {ANALYZE_BATCH_MAX})'
+    return urls, None
+
+def analyze_url_safe(url):
+    """analyze_url para los lotes: un error se devuelve como resultado de esa URL"""
+    try:
+        return analyze_url(url)
+    except Exception as e:
+        print(f"Error en analyze_batch ({url}): {e}")
+        return {
+            'success': False,
+            'error': f'Error al analizar el video: {str(e)}'
+        }
+
+def start_analyze_batch(urls):
+    """Encolar en analyze_pool una extracción por URL distinta.
+
+    Devuelve ({future: url}, {url: [posiciones]}) para repartir cada
+    resultado a todas las posiciones donde aparece la URL.
+    """
+    indexes = {}
+    for index, url in enumerate(urls):
+        indexes.setdefault(url, []).append(index)
+    futures = {analyze_pool.submit(analyze_url_safe, url): url for url in indexes}
+    return futures, indexes
+
+def analyze_batch_summary(total, succeeded, started):
+    return {
+        'done': True,
+        'total': total,
+        'succeeded': succeeded,
+        'failed': total - succeeded,
+        'seconds': round(time.monotonic() - started, 3)
+    }
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analizar varias URLs en paralelo enviando cada resultado como NDJSON al terminar"""
+    if request.is_json:
+        urls = (request.get_json(silent=True) or {}).get('urls')
+    else:
+        # Texto pegado: una URL por línea
+        urls = request.get_data(as_text=True).splitlines()
+    urls, error = parse_batch_urls(urls)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    
+    def generate():
+        started = time.monotonic()
+        futures, indexes = start_analyze_batch(urls)
+        succeeded = 0
+        try:
+            for future in as_completed(futures):
+                url = futures[future]
+                result = future.result()
+                for index in indexes[url]:
+                    succeeded += 1 if result['success'] else 0
+                    yield json.dumps({'index': index, 'url': url, **result}) + '\n'
+        finally:
+            # Cliente desconectado: no extraer lo que todavía no empezó
+            for future in futures:
+                future.cancel()
+        yield json.dumps(analyze_batch_summary(len(urls), succeeded, started)) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
 @app.route('/api/download', methods=['POST'])
 def start_download():
     """Iniciar descarga de video/audio"""
@@ -273,6 +1192,8 @@ def start_download():
         format_type = data.get('format', 'audio')  # 'audio' o 'video'
         quality = data.get('quality', 'best')
         is_playlist = data.get('playlist', False)
+        priority = data.get('priority', 0)
+        audio_mode = str(data.get('audio_mode') or 'mp3').strip().lower()
         download_path = (data.get('download_path') or '').strip()
         
         if not url:
@@ -281,57 +1202,49 @@ def start_download():
                 'error': 'URL no proporcionada'
             })
         
-        # Generar ID único para la descarga
-        download_id = str(uuid.uuid4())
+        if audio_mode not in AUDIO_MODES:
+            return jsonify({
+                'success': False,
+                'error': f'Modo de audio no válido: {audio_mode} (usar {", ".join(AUDIO_MODES)})'
+            }), 400
+        bad_quality = invalid_quality(format_type, normalize_quality(format_type, quality))
+        if bad_quality is not None:
+            return jsonify({
+                'success': False,
+                'error': f'Calidad no válida: {bad_quality}'
+            }), 400
+        if audio_mode == 'fast' and isinstance(normalize_quality(format_type, quality), list):
+            return jsonify({
+                'success': False,
+                'error': 'Varias calidades requieren el modo de audio mp3'
+            }), 400
+        
+        try:
+            priority = int(priority)
+        except (TypeError, ValueError):
+            priority = 0
         
-        # Crear objeto de progreso
-        progress = DownloadProgress(download_id)
-        download_progress[download_id] = progress
-        
-        # Determinar carpeta de descarga
-        target_folder = DOWNLOADS_FOLDER  # Default
-        
-        if download_path:
-            # Si viene con prefijo FSAPI, usar carpeta por defecto (limitación del navegador)
-            if download_path.startswith('FSAPI:'):
-                folder_name = download_path.replace('FSAPI:', '')
-                print(f"📁 Carpeta seleccionada via File System API: {folder_name}")
-                print(f"⚠️  Usando carpeta por defecto debido a limitaciones del navegador: {DOWNLOADS_FOLDER}")
-                target_folder = DOWNLOADS_FOLDER
-            # Si es una ruta manual, validarla
-            elif os.path.isabs(download_path):
-                if os.path.isdir(download_path):
-                    target_folder = download_path
-                    print(f"📁 Usando carpeta personalizada: {target_folder}")
-                else:
-                    # Intentar crear la carpeta si no existe
-                    try:
-                        os.makedirs(download_path, exist_ok=True)
-                        target_folder = download_path
-                        print(f"📁 Carpeta creada y configurada: {target_folder}")
-                    except Exception as e:
-                        print(f"❌ Error creando carpeta {download_path}: {e}")
-                        print(f"📁 Usando carpeta por defecto: {DOWNLOADS_FOLDER}")
-                        target_folder = DOWNLOADS_FOLDER
-            else:
-                print(f"⚠️  Ruta inválida: {download_path}")
-                print(f"📁 Usando carpeta por defecto: {DOWNLOADS_FOLDER}")
-                target_folder = DOWNLOADS_FOLDER
-        
-        # Iniciar descarga en hilo separado
-        download_thread = threading.Thread(
-            target=download_worker,
-            args=(download_id, url, format_type, quality, is_playlist, progress, target_folder)
-        )
-        download_thread.daemon = True
-        download_thread.start()
+        target_folder = resolve_target_folder(download_path)
         
-        active_downloads[download_id] = download_thread
+        try:
+            download_id, reused = submit_download(url, format_type, quality, is_playlist, target_folder,
+                                                  priority, audio_mode)
+        except QueueFullError as e:
+            job_failures.inc(cause='queue_full')
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 503
         
+        progress_data = download_progress.snapshot(download_id) or {}
         return jsonify({
             'success': True,
             'download_id': download_id,
-            'message': 'Descarga iniciada'
+            'queue_position': scheduler.position(download_id),
+            'deduplicated': reused,
+            'audio_mode': audio_mode if format_type == 'audio' else None,
+            'audio_action': progress_data.get('audio_action'),
+            'message': 'Descarga ya completada' if reused and progress_data.get('completed') else 'Descarga iniciada'
         })
         
     except Exception as e:
@@ -341,43 +1254,614 @@ def start_download():
             'error': f'Error al iniciar descarga: {str(e)}'
         })
 
+@app.route('/api/batches', methods=['POST'])
+def create_batch():
+    """Encolar un manifiesto NDJSON de descargas (url, format, quality, path) en un solo paso"""
+    try:
+        if request.is_json:
+            entries = (request.get_json(silent=True) or {}).get('jobs')
+            if not isinstance(entries, list):
+                return jsonify({
+                    'success': False,
+                    'error': 'Se esperaba una lista de trabajos en "jobs"'
+                }), 400
+        else:
+            entries = request.get_data(as_text=True).splitlines()
+        
+        jobs, errors = parse_job_manifest(entries)
+        if errors:
+            return jsonify({
+                'success': False,
+                'error': f'Manifiesto no válido: {len(errors)} líneas con errores',
+                'errors': errors[:100]
+            }), 400
+        if not jobs:
+            return jsonify({
+                'success': False,
+                'error': 'El manifiesto no tiene trabajos'
+            }), 400
+        
+        try:
+            batch_id, download_ids, created = submit_batch(jobs)
+        except QueueFullError as e:
+            job_failures.inc(len(jobs), cause='queue_full')
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 503
+        
+        return jsonify({
+            'success': True,
+            'batch_id': batch_id,
+            'total': len(download_ids),
+            'created': created,
+            'deduplicated': len(download_ids) - created,
+            'download_ids': download_ids,
+            'progress_url': f'/api/batches/{batch_id}'
+        })
+        
+    except Exception as e:
+        print(f"Error en create_batch: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'Error al encolar el lote: {str(e)}'
+        })
+
+def parse_job_manifest(entries):
+    """Validar todas las líneas de un manifiesto; devuelve (trabajos, errores).
+
+    entries son líneas NDJSON o dicts ya decodificados; los errores indican
+    el número de línea (desde 1) para corregir el archivo de una vez.
+    """
+    if len(entries) > BATCH_MAX_JOBS:
+        return [], [{'line': None, 'error': f'Demasiados trabajos: {len(entries)} (máximo {BATCH_MAX_JOBS})'}]
+    
+    jobs, errors = [], []
+    folders = {}
+    for line_number, entry in enumerate(entries, 1):
+        if isinstance(entry, str):
+            if not entry.strip():
+                continue
+            try:
+                entry = json.loads(entry)
+            except ValueError as e:
+                errors.append({'line': line_number, 'error': f'JSON no válido: {e}'})
+                continue
+        if not isinstance(entry, dict):
+            errors.append({'line': line_number, 'error': 'Cada línea debe ser un objeto JSON'})
+            continue
+        
+        url = entry.get('url')
+        format_type = entry.get('format', 'audio')
+        audio_mode = str(entry.get('audio_mode') or 'mp3').strip().lower()
+        path = entry.get('path', entry.get('download_path')) or ''
+        if not isinstance(url, str) or not url.strip():
+            errors.append({'line': line_number, 'error': 'URL no proporcionada'})
+            continue
+        if format_type not in ('audio', 'video'):
+            errors.append({'line': line_number, 'error': f'Formato no válido: {format_type} (usar audio, video)'})
+            continue
+        if audio_mode not in AUDIO_MODES:
+            errors.append({'line': line_number,
+                           'error': f'Modo de audio no válido: {audio_mode} (usar {", ".join(AUDIO_MODES)})'})
+            continue
+        if not isinstance(path, str):
+            errors.append({'line': line_number, 'error': 'La ruta debe ser texto'})
+            continue
+        try:
+            priority = int(entry.get('priority', 0))
+        except (TypeError, ValueError):
+            errors.append({'line': line_number, 'error': f'Prioridad no válida: {entry.get("priority")}'})
+            continue
+        quality = normalize_quality(format_type, entry.get('quality', 'best'))
+        bad_quality = invalid_quality(format_type, quality)
+        if bad_quality is not None:
+            errors.append({'line': line_number, 'error': f'Calidad no válida: {bad_quality}'})
+            continue
+        if audio_mode == 'fast' and isinstance(quality, list):
+            errors.append({'line': line_number, 'error': 'Varias calidades requieren el modo de audio mp3'})
+            continue
+        
+        # Validar sin tocar el disco: submit_batch crea las carpetas si acepta el lote
+        path = path.strip()
+        if path not in folders:
+            folders[path] = target_folder_for(path)
+        if os.path.exists(folders[path]) and not os.path.isdir(folders[path]):
+            errors.append({'line': line_number, 'error': f'La ruta no es una carpeta: {path}'})
+            continue
+        jobs.append({
+            'url': url.strip(),
+            'format': format_type,
+            'quality': quality,
+            'playlist': bool(entry.get('playlist', False)),
+            'target_folder': folders[path],
+            'priority': priority,
+            'audio_mode': audio_mode,
+        })
+    return jobs, errors
+
+@app.route('/api/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Progreso agregado de un lote; con ?entries=1 incluye el estado de cada descarga"""
+    download_ids = job_store.load_batch(batch_id)
+    if download_ids is None:
+        return jsonify({
+            'success': False,
+            'error': 'ID de lote no encontrado'
+        }), 404
+    
+    # Estados en memoria y, para las desalojadas, una sola consulta al historial
+    hot = {download_id: download_progress.get(download_id) for download_id in set(download_ids)}
+    records = job_store.load_many([download_id for download_id, progress in hot.items() if progress is None])
+    
+    entries = []
+    statuses = {}
+    total_percentage = 0
+    for download_id in download_ids:
+        progress = hot[download_id]
+        if progress is not None:
+            entry = {
+                'download_id': download_id,
+                'status': progress.status,
+                'percentage': progress.percentage,
+                'filename': progress.filename,
+                'error': progress.error,
+            }
+        else:
+            record = records.get(download_id) or {'status': 'error', 'error': 'Descarga no encontrada'}
+            entry = {
+                'download_id': download_id,
+                'status': record.get('status'),
+                'percentage': record.get('percentage', 0),
+                'filename': record.get('filename'),
+                'error': record.get('error'),
+            }
+        statuses[entry['status']] = statuses.get(entry['status'], 0) + 1
+        total_percentage += entry['percentage'] or 0
+        entries.append(entry)
+    
+    done = statuses.get('completed', 0)
+    failed = statuses.get('error', 0)
+    response_data = {
+        'success': True,
+        'batch_id': batch_id,
+        'total': len(download_ids),
+        'done': done,
+        'failed': failed,
+        'active': len(download_ids) - done - failed,
+        'statuses': statuses,
+        'percentage': total_percentage / len(download_ids) if download_ids else 100,
+        'finished': done + failed == len(download_ids),
+    }
+    if request.args.get('entries', '').lower() in ('1', 'true', 'yes'):
+        response_data['entries'] = entries
+    return jsonify(response_data)
+
+def target_folder_for(download_path):
+    """Carpeta que corresponde a la ruta del cliente, sin crearla ni registrar nada"""
+    if download_path and os.path.isabs(download_path):
+        return download_path
+    return DOWNLOADS_FOLDER
+
+def resolve_target_folder(download_path):
+    """Determinar la carpeta de descarga a partir de la ruta enviada por el cliente"""
+    target_folder = DOWNLOADS_FOLDER  # Default
+    
+    if download_path:
+        # Si viene con prefijo FSAPI, usar carpeta por defecto (limitación del navegador)
+        if download_path.startswith('FSAPI:'):
+            folder_name = download_path.replace('FSAPI:', '')
+            print(f"📁 Carpeta seleccionada via File System API: {folder_name}")
+            print(f"⚠️  Usando carpeta por defecto debido a limitaciones del navegador: {DOWNLOADS_FOLDER}")
+            target_folder = DOWNLOADS_FOLDER
+        # Si es una ruta manual, validarla
+        elif os.path.isabs(download_path):
+            if os.path.isdir(download_path):
+                target_folder = download_path
+                print(f"📁 Usando carpeta personalizada: {target_folder}")
+            else:
+                # Intentar crear la carpeta si no existe
+                try:
+                    os.makedirs(download_path, exist_ok=True)
+                    target_folder = download_path
+                    print(f"📁 Carpeta creada y configurada: {target_folder}")
+                except Exception as e:
+                    print(f"❌ Error creando carpeta {download_path}: {e}")
+                    print(f"📁 Usando carpeta por defecto: {DOWNLOADS_FOLDER}")
+                    target_folder = DOWNLOADS_FOLDER
+        else:
+            print(f"⚠️  Ruta inválida: {download_path}")
+            print(f"📁 Usando carpeta por defecto: {DOWNLOADS_FOLDER}")
+            target_folder = DOWNLOADS_FOLDER
+    
+    return target_folder
+
+def normalize_quality(format_type, quality):
+    """Normalizar la calidad pedida ('1080p' -> '1080', 'BEST' -> 'best').
+
+    En audio, una lista (o '128,192,320') devuelve la lista sin repetidos;
+    en video se usa solo la primera calidad.
+    """
+    if isinstance(quality, str) and ',' in quality:
+        quality = quality.split(',')
+    if isinstance(quality, (list, tuple)):
+        qualities = []
+        for item in quality:
+            item = normalize_quality(format_type, item)
+            if item not in qualities:
+                qualities.append(item)
+        if format_type != 'audio' or len(qualities) < 2:
+            return qualities[0] if qualities else 'best'
+        return qualities
+    quality = str(quality or 'best').strip().lower()
+    if format_type != 'audio' and quality.endswith('p'):
+        quality = quality[:-1]
+    return quality or 'best'
+
+def invalid_quality(format_type, quality):
+    """Primera calidad ya normalizada que no es 'best' ni un número válido (None si todas valen)"""
+    for item in quality if isinstance(quality, list) else [quality]:
+        if item == 'best':
+            continue
+        if format_type == 'audio':
+            try:
+                if 0 <= float(item) <= 512:
+                    continue
+            except ValueError:
+                pass
+        elif item.isdigit() and len(item) <= 5:
+            continue
+        return item
+    return None
+
+def find_reusable_download(job_key):
+    """ID de una descarga idéntica en curso o terminada con su archivo todavía en disco"""
+    download_id = job_keys.get(job_key)
+    progress = download_progress.get(download_id) if download_id else None
+    if progress is not None and not progress.cancelled and progress.status != 'error':
+        return download_id
+    
+    # Descargas ya terminadas: buscarlas en el historial
+    record = job_store.find_by_key(job_key)
+    if record and record.get('filepath') and os.path.exists(record['filepath']):
+        return record['download_id']
+    
+    # En curso en otro worker
+    if MULTIPROCESS:
+        record = job_store.find_active_by_key(job_key, WORKER_STALE_AFTER)
+        if record:
+            return record['download_id']
+    return None
+
+def build_job_key(url, format_type, quality, is_playlist, target_folder, audio_mode):
+    """Clave de contenido para detectar descargas idénticas (quality ya normalizada)"""
+    content_key = (is_playlist and playlist_cache_key(url)) or video_cache_key(url)
+    # Varias calidades: el mismo conjunto en otro orden es el mismo trabajo
+    key_quality = sorted(quality) if isinstance(quality, list) else quality
+    key = [content_key, format_type, key_quality, bool(is_playlist), os.path.normpath(target_folder)]
+    if format_type == 'audio' and audio_mode != 'mp3':
+        key.append(audio_mode)
+    return json.dumps(key)
+
+def new_progress(job_key, format_type, is_playlist, audio_mode):
+    """Objeto de progreso para una descarga nueva con un ID único"""
+    download_id = str(uuid.uuid4())
+    progress = PlaylistProgress(download_id) if is_playlist else DownloadProgress(download_id)
+    progress.job_key = job_key
+    if format_type == 'audio':
+        progress.audio_mode = audio_mode
+    return progress
+
+def submit_download(url, format_type, quality, is_playlist, target_folder, priority=0, audio_mode='mp3'):
+    """Encolar una descarga o reutilizar una idéntica; devuelve (download_id, reutilizada)"""
+    quality = normalize_quality(format_type, quality)
+    job_key = build_job_key(url, format_type, quality, is_playlist, target_folder, audio_mode)
+    
+    with job_keys_lock:
+        download_id = find_reusable_download(job_key)
+        if download_id:
+            return download_id, True
+        
+        # Crear objeto de progreso y encolar la descarga en el planificador
+        progress = new_progress(job_key, format_type, is_playlist, audio_mode)
+        enqueue_download(progress, {
+            'url': url,
+            'format': format_type,
+            'quality': quality,
+            'playlist': bool(is_playlist),
+            'target_folder': target_folder,
+            'priority': priority,
+        })
+        return progress.download_id, False
+
+def submit_batch(jobs):
+    """Encolar un manifiesto ya validado todo o nada; devuelve (batch_id, download_ids, nuevas).
+
+    Cada trabajo es un dict con url, format, quality (normalizada), playlist,
+    target_folder, priority y audio_mode. Los repetidos, dentro del lote o
+    con descargas existentes, reutilizan el mismo download_id.
+    """
+    batch_id = str(uuid.uuid4())
+    download_ids = []
+    created = []
+    with job_keys_lock:
+        in_batch = {}
+        for job in jobs:
+            job_key = build_job_key(job['url'], job['format'], job['quality'], job['playlist'],
+                                    job['target_folder'], job['audio_mode'])
+            download_id = in_batch.get(job_key) or find_reusable_download(job_key)
+            if download_id is None:
+                progress = new_progress(job_key, job['format'], job['playlist'], job['audio_mode'])
+                progress.request = {key: job[key] for key in
+                                    ('url', 'format', 'quality', 'playlist', 'target_folder', 'priority')}
+                download_id = progress.download_id
+                created.append(progress)
+            in_batch[job_key] = download_id
+            download_ids.append(download_id)
+        
+        # Las demás altas también toman job_keys_lock: la cola solo puede vaciarse mientras tanto
+        queue_limit = max(MAX_QUEUED_DOWNLOADS, BATCH_MAX_QUEUE)
+        if scheduler.stats()['queued'] + len(created) > queue_limit:
+            raise QueueFullError(f'No hay espacio en la cola para {len(created)} descargas, intenta más tarde')
+        
+        # Con el lote aceptado, crear las carpetas que falten
+        for folder in {progress.request['target_folder'] for progress in created}:
+            os.makedirs(folder, exist_ok=True)
+        
+        # Guardar antes de encolar: un trabajo rápido no debe ser pisado por su estado 'queued'
+        download_progress.persist_many(created, batch=(batch_id, download_ids))
+        for progress in created:
+            download_progress[progress.download_id] = progress
+            active_downloads[progress.download_id] = progress.request['url']
+        try:
+            scheduler.submit_many([(
+                progress.download_id,
+                download_worker,
+                (progress.download_id, progress.request['url'], progress.request['format'],
+                 progress.request['quality'], progress.request['playlist'], progress,
+                 progress.request['target_folder']),
+                progress.request['url'],
+                progress.request['priority'],
+            ) for progress in created], max_queue=queue_limit)
+        except QueueFullError:
+            for progress in created:
+                del download_progress[progress.download_id]
+                del active_downloads[progress.download_id]
+            job_store.delete_many([progress.download_id for progress in created])
+            raise
+        
+        for progress in created:
+            job_keys[progress.job_key] = progress.download_id
+    return batch_id, download_ids, len(created)
+
+def enqueue_download(progress, job_request):
+    """Registrar el progreso, encolar el trabajo y guardarlo en el historial.
+
+    job_request son los parámetros de la petición: se guardan con el estado
+    para poder reanudar la descarga si el servidor se reinicia.
+    """
+    download_id = progress.download_id
+    url = job_request['url']
+    progress.request = job_request
+    download_progress[download_id] = progress
+    active_downloads[download_id] = url
+    try:
+        scheduler.submit(
+            download_id,
+            download_worker,
+            args=(download_id, url, job_request['format'], job_request['quality'], job_request['playlist'],
+                  progress, job_request['target_folder']),
+            url=url,
+            priority=job_request['priority'],
+        )
+    except QueueFullError:
+        del download_progress[download_id]
+        del active_downloads[download_id]
+        raise
+    
+    if progress.job_key:
+        job_keys[progress.job_key] = download_id
+    download_progress.persist(progress, progress.job_key)
+
 def download_worker(download_id, url, format_type, quality, is_playlist, progress, target_folder):
     """Worker para realizar la descarga en segundo plano"""
     try:
+        if is_playlist:
+            download_playlist(url, format_type, quality, progress, target_folder)
+        else:
+            # Al terminar la descarga, liberar el espacio del planificador mientras convierte
+            run_download(url, format_type, quality, progress, target_folder,
+                         on_fetched=lambda: scheduler.release(download_id))
+    
+    finally:
+        # Limpiar hilo activo y la clave de contenido en curso
+        active_downloads.pop(download_id, None)
+        with job_keys_lock:
+            if job_keys.get(progress.job_key) == download_id:
+                del job_keys[progress.job_key]
+
+def run_download(url, format_type, quality, progress, target_folder, on_fetched=None):
+    """Descargar un único video actualizando su progreso"""
+    try:
+        progress.check_cancelled()
+        progress.start()
+        download_progress.persist(progress)
         if format_type == 'audio':
-            success = download_audio_api(url, quality, progress.update, target_folder)
+            filepath = download_audio_api(url, quality, progress.update, target_folder, progress,
+                                          on_fetched, progress.audio_mode or 'mp3')
         else:
-            success = download_video_api(url, quality, progress.update, target_folder)
+            filepath = download_video_api(url, quality, progress.update, target_folder, progress)
         
-        if success:
-            progress.complete()
+        if progress.cancelled:
+            cleanup_partial_files(progress)
+        elif filepath:
+            files = filepath if isinstance(filepath, list) else [filepath]
+            if len(files) > 1:
+                progress.files = files
+            progress.complete(files[0])
+            for path in files:
+                library_index.add(path)
         else:
             progress.set_error("Error durante la descarga")
             
+    except DownloadCancelled:
+        cleanup_partial_files(progress)
+
     except Exception as e:
         print(f"Error en download_worker: {e}")
         progress.set_error(str(e))
-    
+
+    finally:
+        download_progress.persist(progress)
+
+def restore_completed(progress):
+    """Recuperar una entrada que ya había terminado antes de un reinicio"""
+    record = job_store.load(progress.download_id)
+    if not record or record.get('status') != 'completed':
+        return False
+    filepath = record.get('filepath')
+    if not filepath or not os.path.exists(filepath):
+        return False
+    progress.files = record.get('filepaths')
+    progress.complete(filepath)
+    return True
+
+def download_playlist(url, format_type, quality, progress, target_folder):
+    """Descargar las entradas de una playlist como trabajos del planificador.
+
+    La playlist solo ocupa un espacio mientras obtiene la lista; luego lo
+    libera y va encolando sus entradas, con como mucho PLAYLIST_CONCURRENCY
+    en la etapa de red a la vez. Cada entrada cuenta para los límites global
+    y por host, y se puede cancelar con su propio download_id.
+    """
+    try:
+        progress.check_cancelled()
+        progress.start()
+        progress.status_text = 'Obteniendo lista de videos...'
+        download_progress.persist(progress)
+        
+        playlist = get_playlist_info(url)
+        if not playlist:
+            progress.set_error('No se pudo obtener la playlist')
+            return
+        if playlist.get('_type') != 'playlist':
+            # La URL no era una playlist: descargar el video suelto
+            child = progress.add_entry(playlist.get('title'))
+            entries = [(url, child)]
+        else:
+            entries = [(playlist_entry_url(entry), progress.add_entry(entry.get('title')))
+                       for entry in playlist['entries']]
+        progress.title = playlist.get('title')
+        close_stale_entries(progress)
+        
+        if not entries:
+            progress.set_error('La playlist no tiene videos')
+            return
+        
+        progress.status = 'downloading'
+        progress._touch()
+        # Guardar las entradas con sus IDs: tras un reinicio se reanudan con ellos
+        download_progress.persist_many([progress] + [child for _, child in entries])
+        
+        # La lista ya está: el espacio queda para las entradas
+        scheduler.release(progress.download_id)
+        priority = (progress.request or {}).get('priority', 0)
+        waiting = [(entry_url, child) for entry_url, child in entries if not restore_completed(child)]
+        for entry_url, child in waiting:
+            active_downloads[child.download_id] = entry_url
+        submitted = []
+        version = progress.version
+        while not progress.cancelled:
+            # Las entradas que ya descargaron convierten sin contar para PLAYLIST_CONCURRENCY
+            fetching = sum(1 for child in submitted if child.status in ('queued', 'starting', 'downloading'))
+            while waiting and fetching < max(1, PLAYLIST_CONCURRENCY):
+                entry_url, child = waiting[0]
+                # Las cancelaciones de entradas que todavía no se encolaron ya las cerraron
+                if child.status not in TERMINAL_STATUSES:
+                    try:
+                        scheduler.submit(child.download_id, download_playlist_entry,
+                                         args=(entry_url, format_type, quality, child, target_folder),
+                                         url=entry_url, priority=priority)
+                    except QueueFullError:
+                        # Cola llena: reintentar en la siguiente vuelta
+                        break
+                    submitted.append(child)
+                    fetching += 1
+                waiting.pop(0)
+            if not waiting and all(child.status in TERMINAL_STATUSES for child in submitted):
+                break
+            # Las entradas notifican a la playlist en cada cambio
+            version = progress.wait_for_change(version, 1.0)
+        
+        if progress.cancelled:
+            return
+        
+        done, failed = progress.counts()
+        if done == 0:
+            progress.set_error(f'No se pudo descargar ningún video ({failed} errores)')
+        else:
+            progress.complete()
+            progress.status_text = f'Playlist completada: {done}/{len(entries)} archivos'
+            if failed:
+                progress.status_text += f' ({failed} con error)'
+            progress._touch()
+            
+    except DownloadCancelled:
+        pass
+
+    except Exception as e:
+        print(f"Error en download_playlist: {e}")
+        progress.set_error(str(e))
+
     finally:
-        # Limpiar hilo activo
-        if download_id in active_downloads:
-            del active_downloads[download_id]
+        # Entradas que no llegaron a encolarse
+        for child in progress.children:
+            if not scheduler.is_queued(child.download_id) and not scheduler.is_running(child.download_id):
+                if child.status not in TERMINAL_STATUSES:
+                    child.set_error(progress.error or 'Playlist interrumpida')
+                active_downloads.pop(child.download_id, None)
+        download_progress.persist(progress)
+
+def close_stale_entries(progress):
+    """Cerrar las entradas de antes del reinicio que la playlist ya no devuelve"""
+    if not progress.resume_ids:
+        return
+    for record in job_store.load_many(progress.resume_ids).values():
+        if record.get('status') not in TERMINAL_STATUSES:
+            mark_interrupted(record)
+    progress.resume_ids = []
+
+def download_playlist_entry(entry_url, format_type, quality, progress, target_folder):
+    """Trabajo del planificador para una entrada de playlist"""
+    try:
+        # Al terminar la descarga, liberar el espacio del planificador mientras convierte
+        run_download(entry_url, format_type, quality, progress, target_folder,
+                     on_fetched=lambda: scheduler.release(progress.download_id))
+    finally:
+        active_downloads.pop(progress.download_id, None)
+
+def progress_snapshot(progress):
+    """Estado serializable de una descarga, con la posición en cola si aplica"""
+    progress_data = progress.to_dict()
+    if progress.status == 'queued':
+        progress_data['queue_position'] = scheduler.position(progress.download_id)
+    return progress_data
 
 @app.route('/api/progress/<download_id>', methods=['GET'])
 def get_progress(download_id):
     """Obtener progreso de descarga"""
     try:
-        if download_id not in download_progress:
+        progress = download_progress.get(download_id)
+        progress_data = progress_snapshot(progress) if progress else download_progress.snapshot(download_id)
+        if progress_data is None:
             return jsonify({
                 'success': False,
                 'error': 'ID de descarga no encontrado'
             })
         
-        progress = download_progress[download_id]
-        
         return jsonify({
             'success': True,
-            'progress': progress.to_dict()
+            'progress': progress_data
         })
         
     except Exception as e:
@@ -387,22 +1871,178 @@ def get_progress(download_id):
             'error': f'Error al obtener progreso: {str(e)}'
         })
 
+@app.route('/api/progress/<download_id>/stream', methods=['GET'])
+def stream_progress(download_id):
+    """Enviar el progreso de descarga como Server-Sent Events"""
+    progress = download_progress.get(download_id)
+    if progress is None:
+        # Descarga terminada que ya no está en memoria: enviar su estado final
+        progress_data = download_progress.snapshot(download_id)
+        if progress_data is None:
+            return jsonify({
+                'success': False,
+                'error': 'ID de descarga no encontrado'
+            }), 404
+        if MULTIPROCESS and progress_data['status'] not in TERMINAL_STATUSES:
+            # La ejecuta otro worker: seguirla por la base compartida
+            return Response(
+                stream_with_context(generate_shared_progress(download_id, progress_data)),
+                mimetype='text/event-stream',
+                headers={
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no',
+                }
+            )
+        return Response(
+            f"data: {json.dumps(progress_data)}\n\n",
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache'}
+        )
+
+    def generate():
+        version = -1
+        last_sent = 0.0
+        last_data = None
+        yield 'retry: 2000\n\n'
+        while True:
+            # Agrupar cambios rápidos: como mucho un evento cada SSE_MIN_INTERVAL
+            wait = SSE_MIN_INTERVAL - (time.monotonic() - last_sent)
+            if wait > 0:
+                time.sleep(wait)
+
+            # En cola la posición cambia sin tocar el progreso: revisarla más seguido
+            timeout = SSE_KEEPALIVE if progress.status != 'queued' else min(SSE_KEEPALIVE, 2)
+            current = progress.wait_for_change(version, timeout)
+            progress_data = progress_snapshot(progress)
+            if current == version and progress_data == last_data:
+                yield ': keep-alive\n\n'
+                continue
+
+            version = current
+            last_sent = time.monotonic()
+            last_data = progress_data
+            yield f"data: {json.dumps(progress_data)}\n\n"
+
+            if progress_data['status'] in ('completed', 'error'):
+                break
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+def generate_shared_progress(download_id, progress_data):
+    """Eventos SSE de una descarga de otro worker, leyendo la base cada SHARED_SYNC_INTERVAL"""
+    interval = max(SSE_MIN_INTERVAL, SHARED_SYNC_INTERVAL)
+    last_sent = time.monotonic()
+    yield 'retry: 2000\n\n'
+    yield f"data: {json.dumps(progress_data)}\n\n"
+    while progress_data['status'] not in TERMINAL_STATUSES:
+        time.sleep(interval)
+        current = download_progress.snapshot(download_id)
+        if current is None:
+            break
+        if current == progress_data:
+            if time.monotonic() - last_sent >= SSE_KEEPALIVE:
+                last_sent = time.monotonic()
+                yield ': keep-alive\n\n'
+            continue
+        progress_data = current
+        last_sent = time.monotonic()
+        yield f"data: {json.dumps(progress_data)}\n\n"
+
+def completed_filepath(download_id, index=None):
+    """Ruta del archivo de una descarga completada (en memoria o en el historial).
+
+    index elige una de las salidas cuando se pidieron varias calidades.
+    """
+    progress = download_progress.get(download_id)
+    if progress is not None:
+        if not progress.completed:
+            return None
+        filepath, files = progress.filepath, progress.files
+    else:
+        record = job_store.load(download_id)
+        if not record or not record.get('completed'):
+            return None
+        filepath, files = record.get('filepath'), record.get('filepaths')
+    if index is None:
+        return filepath
+    files = files or [filepath]
+    return files[index] if 0 <= index < len(files) else None
+
+@app.route('/api/files/<download_id>', methods=['GET'])
+@app.route('/api/files/<download_id>/<int:index>', methods=['GET'])
+def get_file(download_id, index=None):
+    """Servir el archivo de una descarga completada con soporte de Range y caché HTTP"""
+    filepath = completed_filepath(download_id, index)
+    if not filepath or not os.path.isfile(filepath):
+        return jsonify({
+            'success': False,
+            'error': 'Archivo no encontrado o descarga no completada'
+        }), 404
+    
+    # ETag fuerte a partir de inodo, tamaño y mtime: cambia si el archivo se reemplaza
+    stat = os.stat(filepath)
+    etag = f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    
+    # conditional=True resuelve Range/If-Range, If-None-Match (304) e If-Modified-Since;
+    # el cuerpo sale por wsgi.file_wrapper (sendfile en gunicorn) o X-Sendfile
+    response = send_file(
+        filepath,
+        as_attachment=request.args.get('download', '').lower() in ('1', 'true', 'yes'),
+        download_name=os.path.basename(filepath),
+        conditional=True,
+        etag=etag,
+        last_modified=stat.st_mtime,
+        max_age=3600,
+    )
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+def cancel_local_download(download_id):
+    """Cancelar una descarga de este proceso; False si no está activa aquí"""
+    if download_id not in active_downloads:
+        return False
+    
+    # Si todavía no empezó, sacarla de la cola; si está en curso,
+    # liberar su espacio ya: el hook y ffmpeg abortan por su cuenta
+    if not scheduler.cancel(download_id):
+        scheduler.release(download_id)
+    
+    # Marcar como cancelado
+    progress = download_progress.get(download_id)
+    # Entradas de playlist encoladas o en curso
+    for child in getattr(progress, 'children', ()):
+        if active_downloads.pop(child.download_id, None) is not None and not scheduler.cancel(child.download_id):
+            scheduler.release(child.download_id)
+    if progress is not None:
+        progress.cancel()
+        download_progress.persist(progress)
+    
+    # Limpiar
+    active_downloads.pop(download_id, None)
+    return True
+
 @app.route('/api/cancel/<download_id>', methods=['POST'])
 def cancel_download(download_id):
     """Cancelar descarga"""
     try:
-        if download_id in active_downloads:
-            # Marcar como cancelado
-            if download_id in download_progress:
-                download_progress[download_id].set_error('Descarga cancelada por el usuario')
-            
-            # Limpiar
-            del active_downloads[download_id]
-            
+        if cancel_local_download(download_id):
             return jsonify({
                 'success': True,
                 'message': 'Descarga cancelada'
             })
+        elif MULTIPROCESS and job_store.request_cancel(download_id):
+            # La ejecuta otro worker: la cancela al ver la marca en la base
+            return jsonify({
+                'success': True,
+                'message': 'Cancelación solicitada'
+            })
         else:
             return jsonify({
                 'success': False,
@@ -416,6 +2056,97 @@ def cancel_download(download_id):
             'error': f'Error al cancelar descarga: {str(e)}'
         })
 
+@app.route('/api/queue', methods=['GET'])
+def get_queue_status():
+    """Obtener el estado del planificador de descargas"""
+    return jsonify({
+        'success': True,
+        'queue': scheduler.stats(),
+        'postprocess': postprocess_pool.stats(),
+        'analyze': analyze_pool.stats(),
+        'transfer': transfer_tuner.stats(),
+        'worker': {
+            'id': WORKER_ID,
+            'multiprocess': MULTIPROCESS,
+            'workers': job_store.workers(WORKER_STALE_AFTER) if MULTIPROCESS else None,
+        }
+    })
+
+@app.route('/api/admin/bandwidth', methods=['GET', 'POST'])
+def admin_bandwidth():
+    """Consultar o cambiar en caliente el tope de ancho de banda y los pesos"""
+    if ADMIN_TOKEN:
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({
+                'success': False,
+                'error': 'No autorizado'
+            }), 403
+    elif request.method == 'POST':
+        # Sin token configurado los cambios quedan deshabilitados
+        return jsonify({
+            'success': False,
+            'error': 'Cambios deshabilitados: configura YTD_ADMIN_TOKEN'
+        }), 403
+    
+    if request.method == 'GET':
+        return jsonify({'success': True, 'bandwidth': bandwidth.stats()})
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        limit = data.get('limit')
+        if limit is not None:
+            limit = parse_bytes(limit) if isinstance(limit, str) else int(limit)
+            if limit is None or limit < 0:
+                raise ValueError(f'tope no válido: {data.get("limit")}')
+        
+        class_weights = {}
+        for traffic_class, weight in (data.get('weights') or {}).items():
+            if traffic_class not in BANDWIDTH_WEIGHTS:
+                raise ValueError(f'clase de tráfico desconocida: {traffic_class}')
+            class_weights[traffic_class] = positive_weight(weight)
+        job_weights = {job_id: positive_weight(weight) for job_id, weight in (data.get('jobs') or {}).items()}
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': f'Configuración no válida: {e}'
+        }), 400
+    
+    unknown = bandwidth.configure(limit=limit, class_weights=class_weights, job_weights=job_weights)
+    return jsonify({
+        'success': True,
+        'bandwidth': bandwidth.stats(),
+        'unknown_jobs': unknown
+    })
+
+def positive_weight(value):
+    weight = float(value)
+    if not weight > 0:
+        raise ValueError(f'el peso debe ser mayor que 0: {value}')
+    return weight
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache_status():
+    """Obtener estadísticas del caché de metadatos"""
+    return jsonify({
+        'success': True,
+        'cache': info_cache.stats()
+    })
+
+@app.route('/api/ydl-pools', methods=['GET'])
+def get_ydl_pools_status():
+    """Obtener estadísticas de los pools de YoutubeDL y del caché de yt-dlp"""
+    return jsonify({
+        'success': True,
+        'pools': ydl_pools.stats(),
+        'extraction_cache': dict(extraction_cache_stats.stats(), cachedir=YTDLP_CACHE_DIR)
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/open-folder', methods=['POST'])
 def open_download_folder():
     """Abrir carpeta de descargas"""
@@ -439,25 +2170,44 @@ def open_download_folder():
 
 @app.route('/api/downloads', methods=['GET'])
 def list_downloads():
-    """Listar archivos descargados"""
+    """Listar archivos descargados (paginado, con filtros y ETag)"""
     try:
-        files = []
-        if os.path.exists(DOWNLOADS_FOLDER):
-            for filename in os.listdir(DOWNLOADS_FOLDER):
-                filepath = os.path.join(DOWNLOADS_FOLDER, filename)
-                if os.path.isfile(filepath):
-                    stat = os.stat(filepath)
-                    files.append({
-                        'name': filename,
-                        'size': stat.st_size,
-                        'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        'type': 'audio' if filename.endswith('.mp3') else 'video'
-                    })
+        library_index.reconcile()
         
-        return jsonify({
+        etag = library_index.etag
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        
+        args = request.args
+        try:
+            limit = min(max(int(args.get('limit', 100)), 1), 1000)
+            min_size = int(args['min_size']) if args.get('min_size') else None
+            max_size = int(args['max_size']) if args.get('max_size') else None
+            files, next_cursor, total = library_index.query(
+                sort=args.get('sort', 'modified'),
+                order=args.get('order', 'desc'),
+                type_filter=args.get('type') or None,
+                min_size=min_size,
+                max_size=max_size,
+                limit=limit,
+                cursor=args.get('cursor') or None,
+            )
+        except (ValueError, TypeError) as e:
+            return jsonify({
+                'success': False,
+                'error': f'Parámetros no válidos: {str(e)}'
+            }), 400
+        
+        response = jsonify({
             'success': True,
-            'files': sorted(files, key=lambda x: x['modified'], reverse=True)
+            'files': files,
+            'total': total,
+            'next_cursor': next_cursor
         })
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         print(f"Error en list_downloads: {e}")
@@ -480,14 +2230,75 @@ def internal_error(error):
         'error': 'Error interno del servidor'
     }), 500
 
+def sync_shared_state():
+    """Latido del worker y reanudación de descargas huérfanas de workers caídos.
+
+    En modo multiproceso además guarda las descargas de este worker cuando
+    cambian (como mucho cada SHARED_SYNC_INTERVAL) para que otros workers
+    puedan responder por ellas, y atiende las cancelaciones pedidas en otros.
+    """
+    synced = {}
+    last_sweep = time.monotonic()
+    while True:
+        time.sleep(SHARED_SYNC_INTERVAL)
+        try:
+            job_store.heartbeat(WORKER_ID, os.getpid())
+            if MULTIPROCESS:
+                running = [progress for progress in download_progress.values()
+                           if progress.status not in TERMINAL_STATUSES]
+                changed = [progress for progress in running
+                           if synced.get(progress.download_id) != progress.version]
+                if changed:
+                    download_progress.persist_many(changed)
+                synced = {progress.download_id: progress.version for progress in running}
+                
+                for download_id in job_store.cancel_requests(list(active_downloads)):
+                    cancel_local_download(download_id)
+            
+            # Reanudar aquí lo que dejó a medias un worker caído
+            if time.monotonic() - last_sweep >= WORKER_STALE_AFTER:
+                last_sweep = time.monotonic()
+                resume_interrupted_jobs()
+        except Exception as e:
+            print(f"⚠️  Error sincronizando el estado compartido: {e}")
+
+server_start_lock = threading.Lock()
+server_started = threading.Event()
+
+def start_server():
+    """Tareas de arranque del proceso que sirve la API (solo la primera llamada).
+
+    Precalienta YoutubeDL y el caché de yt-dlp, reanuda las descargas
+    interrumpidas y arranca el latido que las reparte entre los workers
+    (en modo multiproceso, también la sincronización del progreso).
+    Importar el módulo no la ejecuta:
+    la llaman el bloque __main__, el lifespan de asgi.py y post_worker_init
+    en gunicorn.conf.py.
+    """
+    with server_start_lock:
+        if server_started.is_set():
+            return
+        server_started.set()
+    # Precalentar sin retrasar el arranque
+    threading.Thread(target=warm_up, daemon=True, name='warm-up').start()
+    resume_interrupted_jobs()
+    threading.Thread(target=sync_shared_state, daemon=True, name='shared-state').start()
+    # Al apagarse ordenadamente, sus descargas pasan enseguida a los demás workers
+    atexit.register(job_store.retire, WORKER_ID)
+
 if __name__ == '__main__':
     print("🚀 Iniciando YouTube Downloader Web API...")
     print(f"📁 Carpeta de descargas: {DOWNLOADS_FOLDER}")
     print(f"🎬 FFmpeg path: {FFMPEG_PATH}")
+    print(f"🗃️  Caché de yt-dlp: {YTDLP_CACHE_DIR}")
     print("🌐 Servidor disponible en: http://localhost:5000")
     print("\n" + "="*50)
     print("YouTube Downloader Web Interface")
     print("Presiona Ctrl+C para detener el servidor")
     print("="*50 + "\n")
     
+    # Con el recargador de Flask (debug) el proceso padre solo vigila archivos: reanudar en el hijo
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_server()
+    
     app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo ASGI de la API
+Sirve la misma API de app.py sobre asyncio. Las rutas con muchas conexiones
+simultáneas se atienden en el event loop sin ocupar un hilo por cliente:
+- /api/progress/<id>/stream (SSE): una sola tarea vigila las versiones de
+  todos los progresos observados y despierta a cada stream al cambiar
+- /api/progress/<id>
+- /api/analyze y /api/analyze/batch: la extracción con yt-dlp va a
+  analyze_pool y el loop solo espera el resultado
+El resto de rutas pasa a la app Flask (WSGI) en un pool acotado de hilos.
+
+Uso:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+    python asgi.py
+"""
+
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.wsgi import FileWrapper
+
+import app as api
+
+# Hilos para las rutas Flask y las lecturas del historial en SQLite
+WSGI_THREADS = int(os.environ.get('YTD_ASGI_WSGI_THREADS', 32))
+
+# Bloques al servir archivos por la app WSGI (cada bloque es un salto al pool)
+FILE_CHUNK_SIZE = 256 * 1024
+
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='asgi-wsgi')
+
+CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+
+
+class ProgressWatcher:
+    """Espera cambios de versión de DownloadProgress sin un hilo por cliente.
+
+    DownloadProgress notifica con threading.Condition; aquí una sola tarea
+    revisa cada interval las versiones de los progresos con streams abiertos.
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self._waiters = {}
+        self._task = None
+
+    async def wait(self, progress, version, timeout, disconnected=None):
+        """Esperar hasta que cambie la versión, venza el timeout o se vaya el cliente"""
+        if progress.version != version:
+            return progress.version
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters[future] = (progress, version)
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        try:
+            waiting = [future] if disconnected is None else [future, disconnected]
+            await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._waiters.pop(future, None)
+            future.cancel()
+        return progress.version
+
+    async def _run(self):
+        while self._waiters:
+            await asyncio.sleep(self.interval)
+            for future, (progress, version) in list(self._waiters.items()):
+                if progress.version != version and not future.done():
+                    future.set_result(None)
+
+    def stats(self):
+        return {'streams': len(self._waiters)}
+
+
+progress_watcher = ProgressWatcher(interval=min(0.1, api.SSE_MIN_INTERVAL))
+
+
+# -- utilidades ASGI ---------------------------------------------------------
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def request_headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+async def send_json(send, data, status=200):
+    body = json.dumps(data).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode())] + CORS_HEADERS,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def start_stream(send, content_type):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', content_type),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')] + CORS_HEADERS,
+    })
+
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(wsgi_executor, func, *args)
+
+
+def parse_json(body):
+    try:
+        data = json.loads(body or b'null')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+# -- rutas nativas -----------------------------------------------------------
+
+async def get_progress(scope, receive, send, download_id):
+    """Igual que GET /api/progress/<id> en app.py"""
+    progress = api.download_progress.get(download_id)
+    if progress is not None:
+        progress_data = api.progress_snapshot(progress)
+    else:
+        # Desalojada de memoria: leer el historial fuera del loop
+        progress_data = await run_blocking(api.download_progress.snapshot, download_id)
+    if progress_data is None:
+        await send_json(send, {'success': False, 'error': 'ID de descarga no encontrado'})
+        return
+    await send_json(send, {'success': True, 'progress': progress_data})
+
+
+async def stream_progress(scope, receive, send, download_id):
+    """Igual que GET /api/progress/<id>/stream en app.py, sin ocupar un hilo"""
+    progress = api.download_progress.get(download_id)
+    if progress is None:
+        progress_data = await run_blocking(api.download_progress.snapshot, download_id)
+        if progress_data is None:
+            await send_json(send, {'success': False, 'error': 'ID de descarga no encontrado'}, 404)
+            return
+        if api.MULTIPROCESS and progress_data['status'] not in api.TERMINAL_STATUSES:
+            await stream_shared_progress(receive, send, download_id, progress_data)
+            return
+        await start_stream(send, b'text/event-stream')
+        await send({'type': 'http.response.body', 'body': f"data: {json.dumps(progress_data)}\n\n".encode()})
+        return
+
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await start_stream(send, b'text/event-stream')
+        await send({'type': 'http.response.body', 'body': b'retry: 2000\n\n', 'more_body': True})
+        version = -1
+        last_sent = 0.0
+        last_data = None
+        while not disconnected.done():
+            # Agrupar cambios rápidos: como mucho un evento cada SSE_MIN_INTERVAL
+            wait = api.SSE_MIN_INTERVAL - (time.monotonic() - last_sent)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            # En cola la posición cambia sin tocar el progreso: revisarla más seguido
+            timeout = api.SSE_KEEPALIVE if progress.status != 'queued' else min(api.SSE_KEEPALIVE, 2)
+            current = await progress_watcher.wait(progress, version, timeout, disconnected)
+            if disconnected.done():
+                return
+            progress_data = api.progress_snapshot(progress)
+            if current == version and progress_data == last_data:
+                await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+                continue
+
+            version = current
+            last_sent = time.monotonic()
+            last_data = progress_data
+            await send({'type': 'http.response.body',
+                        'body': f"data: {json.dumps(progress_data)}\n\n".encode(), 'more_body': True})
+            if progress_data['status'] in ('completed', 'error'):
+                break
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+
+
+async def stream_shared_progress(receive, send, download_id, progress_data):
+    """SSE de una descarga de otro worker (modo multiproceso), leyendo la base compartida"""
+    interval = max(api.SSE_MIN_INTERVAL, api.SHARED_SYNC_INTERVAL)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await start_stream(send, b'text/event-stream')
+        await send({'type': 'http.response.body', 'more_body': True,
+                    'body': f"retry: 2000\n\ndata: {json.dumps(progress_data)}\n\n".encode()})
+        last_sent = time.monotonic()
+        while progress_data['status'] not in api.TERMINAL_STATUSES:
+            await asyncio.wait([disconnected], timeout=interval)
+            if disconnected.done():
+                return
+            current = await run_blocking(api.download_progress.snapshot, download_id)
+            if current is None:
+                break
+            if current == progress_data:
+                if time.monotonic() - last_sent >= api.SSE_KEEPALIVE:
+                    last_sent = time.monotonic()
+                    await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+                continue
+            progress_data = current
+            last_sent = time.monotonic()
+            await send({'type': 'http.response.body',
+                        'body': f"data: {json.dumps(progress_data)}\n\n".encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+
+
+async def analyze(scope, receive, send):
+    """Igual que POST /api/analyze; la extracción espera turno en analyze_pool"""
+    data = parse_json(await read_body(receive))
+    if not data:
+        await send_json(send, {'success': False, 'error': 'No se recibieron datos'})
+        return
+    url = (data.get('url') or '').strip()
+    if not url:
+        await send_json(send, {'success': False, 'error': 'URL no proporcionada'})
+        return
+    try:
+        result = await asyncio.wrap_future(api.analyze_pool.submit(api.analyze_url, url))
+    except Exception as e:
+        print(f"Error en analyze_video: {e}")
+        result = {'success': False, 'error': f'Error al analizar el video: {str(e)}'}
+    await send_json(send, result)
+
+
+async def analyze_batch(scope, receive, send):
+    """Igual que POST /api/analyze/batch: NDJSON a medida que termina cada URL"""
+    body = await read_body(receive)
+    if request_headers(scope).get('content-type', '').startswith('application/json'):
+        urls = (parse_json(body) or {}).get('urls')
+    else:
+        urls = body.decode('utf-8', 'replace').splitlines()
+    urls, error = api.parse_batch_urls(urls)
+    if error:
+        await send_json(send, {'success': False, 'error': error}, 400)
+        return
+
+    started = time.monotonic()
+    futures, indexes = api.start_analyze_batch(urls)
+    pending = {asyncio.wrap_future(future): url for future, url in futures.items()}
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    succeeded = 0
+    try:
+        await start_stream(send, b'application/x-ndjson')
+        while pending:
+            done, _ = await asyncio.wait(list(pending) + [disconnected], return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                return
+            for future in done:
+                url = pending.pop(future)
+                result = future.result()
+                lines = []
+                for index in indexes[url]:
+                    succeeded += 1 if result['success'] else 0
+                    lines.append(json.dumps({'index': index, 'url': url, **result}) + '\n')
+                await send({'type': 'http.response.body', 'body': ''.join(lines).encode(), 'more_body': True})
+        summary = api.analyze_batch_summary(len(urls), succeeded, started)
+        await send({'type': 'http.response.body', 'body': (json.dumps(summary) + '\n').encode()})
+    finally:
+        disconnected.cancel()
+        # Cliente desconectado: no extraer lo que todavía no empezó
+        for future in futures:
+            future.cancel()
+
+
+ROUTES = [
+    ('GET', re.compile(r'^/api/progress/(?P<download_id>[^/]+)/stream$'), stream_progress),
+    ('GET', re.compile(r'^/api/progress/(?P<download_id>[^/]+)$'), get_progress),
+    ('POST', re.compile(r'^/api/analyze$'), analyze),
+    ('POST', re.compile(r'^/api/analyze/batch$'), analyze_batch),
+]
+
+
+# -- resto de la API por WSGI ------------------------------------------------
+
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': lambda file, buffer_size=8192: FileWrapper(file, max(buffer_size, FILE_CHUNK_SIZE)),
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    # El cuerpo ya está completo: su largo vale también para subidas chunked sin Content-Length
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ['wsgi.input_terminated'] = True
+    return environ
+
+
+async def wsgi_fallback(scope, receive, send):
+    """Ejecutar la app Flask en wsgi_executor y enviar su respuesta por bloques"""
+    environ = wsgi_environ(scope, await read_body(receive))
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    def call():
+        result = api.app(environ, start_response)
+        return result, iter(result)
+
+    result, iterator = await run_blocking(call)
+    try:
+        chunk = await run_blocking(next, iterator, None)
+        await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await run_blocking(next, iterator, None)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await run_blocking(result.close)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Precalentar YoutubeDL, reanudar descargas y sincronización multiproceso
+            api.start_server()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            api.ydl_pools.close()
+            wsgi_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """Aplicación ASGI: rutas nativas en el loop y el resto por la app Flask"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    for method, pattern, handler in ROUTES:
+        if scope['method'] == method:
+            match = pattern.match(scope['path'])
+            if match:
+                await handler(scope, receive, send, **match.groupdict())
+                return
+    await wsgi_fallback(scope, receive, send)
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("Error: el modo ASGI necesita uvicorn (pip install uvicorn)")
+        sys.exit(1)
+
+    print("🚀 Iniciando YouTube Downloader Web API (ASGI)...")
+    print("🌐 Servidor disponible en: http://localhost:5000")
+    uvicorn.run(application, host='0.0.0.0', port=5000, log_level='warning')
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Limitador de ancho de banda compartido entre descargas
+Un token bucket global fija el tope (bytes/s) y el reparto entre descargas
+es justo y ponderado (start-time fair queueing): cuando el tope está
+saturado, cada descarga recibe una parte proporcional a su peso; si alguna
+no usa su parte, las demás la aprovechan. El peso sale de la clase de
+tráfico (audio, video) o de un valor propio de la descarga, y todo se puede
+cambiar en caliente.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class BandwidthLease:
+    """Registro de una descarga en el limitador; hook() va en los progress hooks de yt-dlp"""
+
+    def __init__(self, scheduler, job_id, traffic_class, group=None, cancel_event=None):
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.traffic_class = traffic_class
+        self.group = group
+        self.cancel_event = cancel_event
+        self.weight = None          # None: peso de la clase de tráfico
+        self.finish_tag = 0.0
+        self.bytes = 0
+        self.throttled_seconds = 0.0
+        self.started = time.monotonic()
+        self._seen = {}
+
+    def hook(self, d):
+        """Cobrar los bytes recibidos desde la llamada anterior (esperando si hace falta)"""
+        if d['status'] != 'downloading':
+            return
+        filename = d.get('filename')
+        downloaded = d.get('downloaded_bytes') or 0
+        delta = downloaded - self._seen.get(filename, 0)
+        if delta > 0:
+            self._seen[filename] = downloaded
+            self.scheduler.consume(self, delta)
+
+    def to_dict(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'download_id': self.job_id,
+            'group': self.group,
+            'traffic_class': self.traffic_class,
+            'weight': self.scheduler.weight(self),
+            'bytes': self.bytes,
+            'rate_bps': round(self.bytes / elapsed) if elapsed > 0 else None,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+        }
+
+
+class BandwidthScheduler:
+    def __init__(self, limit=0, class_weights=None, burst_seconds=0.5):
+        self.limit = max(0, int(limit or 0))
+        self.class_weights = dict(class_weights or {})
+        self.burst_seconds = burst_seconds
+
+        self._cond = threading.Condition()
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+        self._queue = []
+        self._seq = itertools.count()
+        self._vclock = 0.0
+        self._leases = {}
+
+        self.bytes = 0
+        self.throttled_seconds = 0.0
+
+    def lease(self, job_id, traffic_class, group=None, cancel_event=None):
+        lease = BandwidthLease(self, job_id, traffic_class, group, cancel_event)
+        with self._cond:
+            self._leases[lease] = None
+        return lease
+
+    def release(self, lease):
+        with self._cond:
+            self._leases.pop(lease, None)
+
+    def weight(self, lease):
+        if lease.weight is not None:
+            return lease.weight
+        return self.class_weights.get(lease.traffic_class, 1.0)
+
+    def configure(self, limit=None, class_weights=None, job_weights=None):
+        """Cambiar tope, pesos por clase y pesos por descarga (o grupo); devuelve los IDs sin descarga activa"""
+        unknown = []
+        with self._cond:
+            if limit is not None:
+                self.limit = max(0, int(limit))
+                self._tokens = min(self._tokens, self.limit * self.burst_seconds)
+            if class_weights:
+                self.class_weights.update(class_weights)
+            for job_id, weight in (job_weights or {}).items():
+                matched = [lease for lease in self._leases if job_id in (lease.job_id, lease.group)]
+                for lease in matched:
+                    lease.weight = weight
+                if not matched:
+                    unknown.append(job_id)
+            self._cond.notify_all()
+        return unknown
+
+    def _refill(self):
+        now = time.monotonic()
+        capacity = self.limit * self.burst_seconds
+        self._tokens = min(capacity, self._tokens + (now - self._refilled) * self.limit)
+        self._refilled = now
+
+    def consume(self, lease, amount):
+        """Cobrar amount bytes a la descarga; bloquea mientras el tope esté saturado"""
+        with self._cond:
+            self.bytes += amount
+            lease.bytes += amount
+            if not self.limit:
+                return
+
+            # Etiqueta de inicio: las descargas con menos servicio ponderado pasan antes
+            start = max(self._vclock, lease.finish_tag)
+            lease.finish_tag = start + amount / self.weight(lease)
+            ticket = (start, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+
+            # Los bytes ya se recibieron: quien los pidió espera su propia deuda
+            # sin soltar el turno, para que no la pague la siguiente descarga
+            began = time.monotonic()
+            charged = False
+            while True:
+                if lease.cancel_event is not None and lease.cancel_event.is_set():
+                    # El hook de progreso levanta DownloadCancelled en la siguiente llamada
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    break
+                if self._queue[0] is not ticket:
+                    self._cond.wait(0.5)
+                    continue
+                if not self.limit:
+                    heapq.heappop(self._queue)
+                    break
+                self._refill()
+                if not charged and self._tokens >= min(amount, self.limit * self.burst_seconds):
+                    self._tokens -= amount
+                    charged = True
+                if charged and self._tokens >= 0:
+                    heapq.heappop(self._queue)
+                    break
+                needed = (min(amount, self.limit * self.burst_seconds) if not charged else 0) - self._tokens
+                self._cond.wait(min(0.5, needed / self.limit + 0.001))
+
+            self._vclock = max(self._vclock, start)
+            self._cond.notify_all()
+
+            waited = time.monotonic() - began
+            lease.throttled_seconds += waited
+            self.throttled_seconds += waited
+
+    def waiting(self):
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self):
+        with self._cond:
+            leases = list(self._leases)
+            return {
+                'limit_bps': self.limit,
+                'class_weights': dict(self.class_weights),
+                'waiting': len(self._queue),
+                'bytes': self.bytes,
+                'throttled_seconds': round(self.throttled_seconds, 3),
+                'active': [lease.to_dict() for lease in leases],
+            }
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark del hook de progreso
+Compara el costo por llamada de DownloadProgress.update frente a la versión
+anterior, que formateaba velocidad y ETA en cada bloque recibido.
+
+Uso:
+    python benchmarks/bench_progress_hook.py [--calls 200000]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_backend import load_app
+
+
+class LegacyDownloadProgress:
+    """Copia del hook original (antes de __slots__ y del agrupamiento)"""
+
+    def __init__(self, download_id):
+        self.download_id = download_id
+        self.status = 'starting'
+        self.percentage = 0
+        self.speed = None
+        self.eta = None
+        self.status_text = 'Iniciando descarga...'
+
+    def update(self, d):
+        if d['status'] == 'downloading':
+            self.status = 'downloading'
+            self.status_text = 'Descargando...'
+
+            if 'total_bytes' in d and d['total_bytes']:
+                self.percentage = (d['downloaded_bytes'] / d['total_bytes']) * 100
+            elif 'total_bytes_estimate' in d and d['total_bytes_estimate']:
+                self.percentage = (d['downloaded_bytes'] / d['total_bytes_estimate']) * 100
+
+            if 'speed' in d and d['speed']:
+                speed_kbps = d['speed'] / 1024
+                if speed_kbps > 1024:
+                    self.speed = f"{speed_kbps/1024:.1f} MB/s"
+                else:
+                    self.speed = f"{speed_kbps:.1f} KB/s"
+
+            if 'eta' in d and d['eta']:
+                eta_minutes = d['eta'] // 60
+                eta_seconds = d['eta'] % 60
+                self.eta = f"{eta_minutes:02d}:{eta_seconds:02d}"
+
+
+def make_events(calls, total=50 * 1024 * 1024):
+    """Eventos 'downloading' como los que emite yt-dlp por cada bloque"""
+    chunk = max(1, total // calls)
+    return [{
+        'status': 'downloading',
+        'downloaded_bytes': i * chunk,
+        'total_bytes': total,
+        'speed': 3.5 * 1024 * 1024,
+        'eta': (calls - i) // 100,
+        'filename': 'video.mp4',
+    } for i in range(calls)]
+
+
+def time_hook(progress, events):
+    update = progress.update
+    start = time.perf_counter()
+    for d in events:
+        update(d)
+    return (time.perf_counter() - start) / len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del hook de progreso')
+    parser.add_argument('--calls', type=int, default=200000, help='llamadas al hook por medición')
+    parser.add_argument('--repeat', type=int, default=5, help='repeticiones (se toma la mejor)')
+    args = parser.parse_args()
+
+    # app.py aislado en un directorio temporal: el hook guarda estados en su base
+    workdir = tempfile.mkdtemp(prefix='ytd-bench-')
+    try:
+        app = load_app(workdir)
+        events = make_events(args.calls)
+        results = {}
+        for name, cls in (('antes', LegacyDownloadProgress), ('ahora', app.DownloadProgress)):
+            results[name] = min(time_hook(cls('bench'), events) for _ in range(args.repeat))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, per_call in results.items():
+        print(f"{name:>6}: {per_call * 1e9:8.1f} ns por llamada")
+    print(f"mejora: {results['antes'] / results['ahora']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
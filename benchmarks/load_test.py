@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga HTTP de la API
+Sirve app.app con el servidor WSGI de Werkzeug (con hilos) y el backend falso
+de stub_backend en lugar de YouTube, y lanza clientes concurrentes contra
+/api/analyze, /api/download, /api/progress y /api/downloads.
+Por cada etapa informa latencia p50/p95/p99 y tasa de error por endpoint,
+además de hilos del servidor en uso y RSS del proceso.
+
+Perfiles:
+- ramp: sube de --start-clients a --max-clients en pasos de --step clientes
+- soak: --clients fijos durante --duration segundos, medidos por ventanas
+
+Uso:
+    python benchmarks/load_test.py ramp --max-clients 200
+    python benchmarks/load_test.py soak --clients 100 --duration 600 -o soak.json
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+ENDPOINTS = ('analyze', 'download', 'progress', 'downloads')
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def rss_mb():
+    """Memoria residente actual del proceso (pico si no hay /proc)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Stage:
+    """Muestras de una etapa: latencias por endpoint, hilos y RSS"""
+
+    def __init__(self, name, clients):
+        self.name = name
+        self.clients = clients
+        self.started = time.perf_counter()
+        self.ended = None
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.codes = {name: Counter() for name in ENDPOINTS}
+        self.errors = Counter()
+        self.threads = []
+        self.rss = []
+
+    def summary(self):
+        elapsed = (self.ended or time.perf_counter()) - self.started
+        endpoints = {}
+        for name in ENDPOINTS:
+            samples = sorted(self.latencies[name])
+            if not samples:
+                continue
+            endpoints[name] = {
+                'requests': len(samples),
+                'rps': round(len(samples) / elapsed, 1),
+                'p50_ms': round(percentile(samples, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(samples, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+                'max_ms': round(samples[-1] * 1000, 2),
+                'error_rate': round(self.errors[name] / len(samples), 4),
+                'status': dict(self.codes[name]),
+            }
+        return {
+            'stage': self.name,
+            'clients': self.clients,
+            'seconds': round(elapsed, 2),
+            'endpoints': endpoints,
+            'threads_max': max(self.threads, default=0),
+            'threads_mean': round(sum(self.threads) / len(self.threads), 1) if self.threads else 0,
+            'rss_mb_start': round(self.rss[0], 1) if self.rss else None,
+            'rss_mb_end': round(self.rss[-1], 1) if self.rss else None,
+            'rss_mb_max': round(max(self.rss), 1) if self.rss else None,
+        }
+
+
+class LoadTest:
+    def __init__(self, app, media, args):
+        self.app = app
+        self.media = media
+        self.args = args
+        self.weights = [args.weight_analyze, args.weight_download, args.weight_progress, args.weight_downloads]
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._clients = []
+        self._download_ids = deque(maxlen=1000)
+        self._known_videos = [uuid.uuid4().hex[:11] for _ in range(args.videos)]
+        self.stage = None
+        self.stages = []
+
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app.app, threaded=True)
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    # -- peticiones -------------------------------------------------------
+
+    def _request(self, method, path, body=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.args.request_timeout)
+        try:
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            return response.status, data
+        finally:
+            conn.close()
+
+    def _analyze(self, rng):
+        if rng.random() < self.args.analyze_miss:
+            video_id = uuid.uuid4().hex[:11]
+        else:
+            video_id = rng.choice(self._known_videos)
+        return self._request('POST', '/api/analyze', {'url': self.media.watch_url(video_id)})
+
+    def _download(self, rng):
+        url = self.media.watch_url(uuid.uuid4().hex[:11], size=self.args.job_kb * 1024)
+        status, data = self._request('POST', '/api/download', {'url': url, 'format': 'video', 'quality': 'best'})
+        if status == 200:
+            download_id = json.loads(data).get('download_id')
+            if download_id:
+                self._download_ids.append(download_id)
+        return status, data
+
+    def _progress(self, rng):
+        download_id = rng.choice(self._download_ids)
+        return self._request('GET', f'/api/progress/{download_id}')
+
+    def _downloads(self, rng):
+        return self._request('GET', '/api/downloads?limit=50')
+
+    # -- clientes y etapas -----------------------------------------------
+
+    def _client(self, seed):
+        rng = random.Random(seed)
+        actions = (self._analyze, self._download, self._progress, self._downloads)
+        while not self._stop.is_set():
+            index = rng.choices(range(len(ENDPOINTS)), weights=self.weights)[0]
+            # _progress sin descargas previas se mide como /api/downloads
+            if index == 2 and not self._download_ids:
+                index = 3
+            name = ENDPOINTS[index]
+            start = time.perf_counter()
+            try:
+                status, data = actions[index](rng)
+                failed = status >= 400 or (status == 200 and not json.loads(data).get('success'))
+                code = str(status)
+            except Exception as e:
+                failed, code = True, type(e).__name__
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                stage = self.stage
+                stage.latencies[name].append(elapsed)
+                stage.codes[name][code] += 1
+                if failed:
+                    stage.errors[name] += 1
+            if self.args.think_time:
+                time.sleep(rng.uniform(0, 2 * self.args.think_time))
+
+    def _monitor(self):
+        while True:
+            stage = self.stage
+            if stage is not None:
+                # Los clientes corren en este mismo proceso: no contarlos como hilos del servidor
+                stage.threads.append(threading.active_count() - len(self._clients))
+                stage.rss.append(rss_mb())
+            time.sleep(0.25)
+
+    def set_clients(self, count):
+        while len(self._clients) < count:
+            thread = threading.Thread(target=self._client, args=(len(self._clients),), daemon=True)
+            self._clients.append(thread)
+            thread.start()
+
+    def run_stage(self, name, clients, seconds):
+        with self._lock:
+            if self.stage is not None:
+                self.stage.ended = time.perf_counter()
+            self.stage = Stage(name, clients)
+            self.stages.append(self.stage)
+        self.set_clients(clients)
+        time.sleep(seconds)
+        summary = self.stage.summary()
+        print_stage(summary)
+        return summary
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._clients:
+            thread.join(timeout=self.args.request_timeout)
+        if self.stage is not None:
+            self.stage.ended = time.perf_counter()
+        self.server.shutdown()
+
+
+def print_stage(summary):
+    print(f"\n📊 {summary['stage']}: {summary['clients']} clientes, "
+          f"{summary['threads_max']} hilos (máx), RSS {summary['rss_mb_end']} MB")
+    for name, data in summary['endpoints'].items():
+        print(f"   {name:<10} {data['requests']:>7} req {data['rps']:>8} req/s  "
+              f"p50 {data['p50_ms']:>8} ms  p95 {data['p95_ms']:>8} ms  p99 {data['p99_ms']:>8} ms  "
+              f"errores {data['error_rate'] * 100:5.1f}%")
+
+
+def run(args):
+    from stub_backend import MediaServer, load_app
+
+    workdir = tempfile.mkdtemp(prefix='ytd-load-')
+    app = load_app(workdir, YTD_MAX_QUEUE=args.max_queue)
+    media = MediaServer().start()
+    test = LoadTest(app, media, args)
+
+    results = {'profile': args.profile, 'args': vars(args), 'stages': []}
+    try:
+        if args.profile == 'ramp':
+            for clients in range(args.start_clients, args.max_clients + 1, args.step):
+                results['stages'].append(test.run_stage(f'ramp-{clients}', clients, args.step_seconds))
+        else:
+            windows = max(1, int(args.duration // args.window))
+            for i in range(windows):
+                results['stages'].append(test.run_stage(f'soak-{i + 1}', args.clients, args.window))
+    finally:
+        test.stop()
+        media.stop()
+        app.ydl_pools.close()
+    results['scheduler'] = app.scheduler.stats()
+    results['info_cache'] = app.info_cache.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de la API con backend local')
+    parser.add_argument('profile', choices=('ramp', 'soak'))
+    parser.add_argument('--output', '-o', help='archivo JSON de resultados')
+    parser.add_argument('--start-clients', type=int, default=10)
+    parser.add_argument('--max-clients', type=int, default=150)
+    parser.add_argument('--step', type=int, default=20)
+    parser.add_argument('--step-seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=300)
+    parser.add_argument('--window', type=float, default=30, help='duración de cada ventana en soak (s)')
+    parser.add_argument('--think-time', type=float, default=0.05, help='pausa media entre peticiones (s)')
+    parser.add_argument('--request-timeout', type=float, default=30)
+    parser.add_argument('--weight-analyze', type=float, default=3)
+    parser.add_argument('--weight-download', type=float, default=0.5)
+    parser.add_argument('--weight-progress', type=float, default=5)
+    parser.add_argument('--weight-downloads', type=float, default=1.5)
+    parser.add_argument('--analyze-miss', type=float, default=0.2, help='fracción de URLs nuevas en analyze')
+    parser.add_argument('--videos', type=int, default=50, help='URLs conocidas que repite analyze')
+    parser.add_argument('--job-kb', type=int, default=256, help='tamaño de cada descarga (KB)')
+    parser.add_argument('--max-queue', type=int, default=100, help='YTD_MAX_QUEUE del servidor')
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"\n💾 Resultados guardados en: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
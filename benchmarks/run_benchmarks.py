@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Suite de benchmarks sin red
+Levanta un servidor HTTP local con medios sintéticos y un extractor falso
+(stub_backend) y mide, contra el código real de app.py:
+- analyze: latencia de extract_video_info y de get_video_info cacheado
+- download: MB/s de download_video_api (HTTP simple o HLS con --segments)
+- hook: costo por llamada de DownloadProgress.update
+- ffmpeg: tiempo de transcode_to_mp3 (se omite si no hay ffmpeg)
+- e2e: tiempo de trabajos completos por el planificador con distinta concurrencia
+Los resultados se escriben en JSON para comparar ejecuciones.
+
+Uso:
+    python benchmarks/run_benchmarks.py [--output resultados.json] [--quick]
+    python benchmarks/run_benchmarks.py --compare antes.json despues.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+MB = 1024 * 1024
+
+# Métricas donde un valor mayor es mejor (el resto son tiempos)
+HIGHER_IS_BETTER = ('mb_per_s', 'jobs_per_s', 'speedup')
+
+
+def summarize(samples):
+    """Estadísticas en milisegundos de una lista de tiempos en segundos"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'n': len(samples),
+        'mean_ms': round(statistics.mean(samples) * 1000, 3),
+        'p50_ms': round(statistics.median(samples) * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+    }
+
+
+def bench_analyze(app, server, args):
+    """Latencia de extracción en frío (URL nueva) y servida por el caché de metadatos"""
+    cold = []
+    for _ in range(args.analyze_runs):
+        url = server.watch_url(uuid.uuid4().hex[:11], delay=args.extract_delay)
+        start = time.perf_counter()
+        info = app.extract_video_info(url)
+        cold.append(time.perf_counter() - start)
+        assert info and info.get('formats'), 'la extracción no devolvió formatos'
+
+    url = server.watch_url('cachedvideo', delay=args.extract_delay)
+    app.get_video_info(url)
+    cached = []
+    for _ in range(args.analyze_runs):
+        start = time.perf_counter()
+        app.get_video_info(url)
+        cached.append(time.perf_counter() - start)
+
+    return {'extract': summarize(cold), 'cached': summarize(cached)}
+
+
+def bench_download(app, server, args, folder):
+    """Rendimiento de download_video_api sin límite de velocidad en el servidor"""
+    size = args.download_mb * MB
+    results = []
+    fragments = []
+    connections = []
+    for _ in range(args.download_runs):
+        progress = app.DownloadProgress('bench')
+        url = server.watch_url(uuid.uuid4().hex[:11], size=size, segments=args.segments)
+        start = time.perf_counter()
+        path = app.download_video_api(url, 'best', progress.update, folder, progress)
+        elapsed = time.perf_counter() - start
+        assert path and os.path.getsize(path) == size, 'descarga incompleta'
+        os.remove(path)
+        results.append(elapsed)
+        fragments.append(progress.transfer.fragments)
+        connections.append(progress.transfer.reserved)
+
+    best = min(results)
+    return {
+        'size_mb': args.download_mb,
+        'segments': args.segments,
+        'fragments': fragments,
+        'connections': connections,
+        'time': summarize(results),
+        'mb_per_s': round(args.download_mb / best, 1),
+    }
+
+
+def bench_hook(app, args):
+    """Costo por llamada del hook de progreso (ver bench_progress_hook.py)"""
+    from bench_progress_hook import LegacyDownloadProgress, make_events, time_hook
+
+    events = make_events(args.hook_calls)
+    current = min(time_hook(app.DownloadProgress('bench'), events) for _ in range(3))
+    legacy = min(time_hook(LegacyDownloadProgress('bench'), events) for _ in range(3))
+    return {
+        'calls': args.hook_calls,
+        'ns_per_call': round(current * 1e9, 1),
+        'legacy_ns_per_call': round(legacy * 1e9, 1),
+        'speedup': round(legacy / current, 2),
+    }
+
+
+def bench_ffmpeg(app, args, folder):
+    """Tiempo de transcode_to_mp3 sobre audio generado con ffmpeg (lavfi)"""
+    ffmpeg = app.ffmpeg_executable()
+    if not shutil.which(ffmpeg):
+        return {'skipped': 'ffmpeg no encontrado'}
+
+    source = os.path.join(folder, 'bench-source.wav')
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'lavfi',
+                    '-i', f'sine=frequency=440:duration={args.audio_seconds}',
+                    '-ac', '2', '-ar', '44100', source], check=True)
+
+    results = {}
+    for quality in ('128', '192', '320'):
+        samples = []
+        for _ in range(args.ffmpeg_runs):
+            path = os.path.join(folder, f'bench-{quality}.wav')
+            shutil.copyfile(source, path)
+            start = time.perf_counter()
+            output = app.transcode_to_mp3(path, quality)
+            samples.append(time.perf_counter() - start)
+            os.remove(output)
+        results[quality] = summarize(samples)
+    os.remove(source)
+    return {'audio_seconds': args.audio_seconds, 'transcode': results}
+
+
+def wait_for_jobs(app, download_ids, timeout):
+    deadline = time.monotonic() + timeout
+    pending = set(download_ids)
+    while pending:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'{len(pending)} trabajos sin terminar')
+        for download_id in list(pending):
+            progress = app.download_progress.get(download_id)
+            if progress is None or progress.status in ('completed', 'error'):
+                pending.discard(download_id)
+        time.sleep(0.01)
+
+
+def bench_e2e(app, server, args, folder):
+    """Trabajos completos (planificador, pool, hook, persistencia) con distinta concurrencia"""
+    size = args.job_mb * MB
+    results = {}
+    for workers in args.concurrency:
+        app.scheduler.max_workers = workers
+        app.scheduler.per_host_limit = workers
+        urls = [server.watch_url(uuid.uuid4().hex[:11], size=size, rate=args.rate_mb * MB, segments=args.segments)
+                for _ in range(args.jobs)]
+
+        start = time.perf_counter()
+        download_ids = [app.submit_download(url, 'video', 'best', False, folder)[0] for url in urls]
+        wait_for_jobs(app, download_ids, timeout=args.timeout)
+        elapsed = time.perf_counter() - start
+
+        errors = [download_id for download_id in download_ids
+                  if app.download_progress.snapshot(download_id)['status'] != 'completed']
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder, name))
+
+        results[str(workers)] = {
+            'jobs': args.jobs,
+            'errors': len(errors),
+            'seconds': round(elapsed, 3),
+            'jobs_per_s': round(args.jobs / elapsed, 2),
+            'mb_per_s': round(args.jobs * args.job_mb / elapsed, 1),
+        }
+    return {'job_mb': args.job_mb, 'server_rate_mb_per_s': args.rate_mb, 'concurrency': results}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args):
+    from stub_backend import MediaServer, load_app
+    import yt_dlp
+
+    workdir = tempfile.mkdtemp(prefix='ytd-bench-')
+    app = load_app(workdir, YTD_MAX_QUEUE=max(100, args.jobs))
+    server = MediaServer().start()
+    folder = os.path.join(workdir, 'out')
+    os.makedirs(folder)
+
+    suites = {
+        'analyze': lambda: bench_analyze(app, server, args),
+        'download': lambda: bench_download(app, server, args, folder),
+        'hook': lambda: bench_hook(app, args),
+        'ffmpeg': lambda: bench_ffmpeg(app, args, folder),
+        'e2e': lambda: bench_e2e(app, server, args, folder),
+    }
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'yt_dlp': yt_dlp.version.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+    }
+    try:
+        for name in args.only or suites:
+            print(f"⏱️  {name}...")
+            results[name] = suites[name]()
+    finally:
+        server.stop()
+        app.ydl_pools.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def flatten(data, prefix=''):
+    """Métricas numéricas de un resultado como {'ruta.de.metrica': valor}"""
+    metrics = {}
+    for key, value in data.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            metrics.update(flatten(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[path] = value
+    return metrics
+
+
+def compare(before_path, after_path):
+    """Imprimir la variación de cada métrica entre dos ejecuciones"""
+    with open(before_path, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, encoding='utf-8') as f:
+        after = json.load(f)
+    before.pop('meta', None)
+    after.pop('meta', None)
+
+    old, new = flatten(before), flatten(after)
+    for path in sorted(old.keys() & new.keys()):
+        if path.endswith(('.n', '.jobs', '.calls', '.errors', 'size_mb', 'job_mb', 'audio_seconds', 'rate_mb_per_s', 'segments')):
+            continue
+        a, b = old[path], new[path]
+        if not a:
+            continue
+        change = (b - a) / a * 100
+        better = change > 0 if path.endswith(HIGHER_IS_BETTER) else change < 0
+        mark = '✅' if better and abs(change) >= 5 else '❌' if abs(change) >= 5 else '  '
+        print(f"{mark} {path:<45} {a:>12} -> {b:<12} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks sin red de análisis, descarga y conversión')
+    parser.add_argument('--output', '-o', help='archivo JSON de resultados (por defecto, salida estándar)')
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DESPUES'), help='comparar dos resultados')
+    parser.add_argument('--only', nargs='+', choices=('analyze', 'download', 'hook', 'ffmpeg', 'e2e'),
+                        help='ejecutar solo algunas pruebas')
+    parser.add_argument('--quick', action='store_true', help='tamaños y repeticiones reducidos')
+    parser.add_argument('--analyze-runs', type=int, default=50)
+    parser.add_argument('--extract-delay', type=float, default=0.0, help='latencia simulada por extracción (s)')
+    parser.add_argument('--download-mb', type=int, default=64)
+    parser.add_argument('--download-runs', type=int, default=5)
+    parser.add_argument('--hook-calls', type=int, default=200000)
+    parser.add_argument('--audio-seconds', type=int, default=180)
+    parser.add_argument('--ffmpeg-runs', type=int, default=3)
+    parser.add_argument('--jobs', type=int, default=16, help='trabajos por nivel de concurrencia')
+    parser.add_argument('--job-mb', type=int, default=8)
+    parser.add_argument('--rate-mb', type=float, default=16, help='límite por conexión del servidor (MB/s)')
+    parser.add_argument('--segments', type=int, default=0,
+                        help='servir los videos como HLS con N fragmentos (0: HTTP simple)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.quick:
+        args.analyze_runs, args.download_mb, args.download_runs = 10, 16, 2
+        args.hook_calls, args.audio_seconds, args.ffmpeg_runs = 50000, 30, 1
+        args.jobs, args.job_mb, args.concurrency = 8, 2, [1, 4]
+
+    results = run_suite(args)
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"💾 Resultados guardados en: {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
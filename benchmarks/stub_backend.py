@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend local para benchmarks sin red
+- MediaServer: servidor HTTP en 127.0.0.1 que sirve medios sintéticos con
+  soporte de Range y, opcionalmente, un límite de velocidad por conexión.
+- StubMediaIE: extractor de yt-dlp para URLs http://127.0.0.1:<puerto>/watch/<id>
+  que devuelve formatos de audio y video apuntando al MediaServer; con
+  segments=N añade un formato HLS de N fragmentos (el mejor).
+"""
+
+import http.server
+import importlib
+import os
+import re
+import socketserver
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from yt_dlp.extractor.common import InfoExtractor
+
+CHUNK = 64 * 1024
+
+
+class _MediaHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _params(self):
+        query = parse_qs(urlparse(self.path).query)
+        size = int((query.get('size') or [8 * 1024 * 1024])[0])
+        rate = float((query.get('rate') or [0])[0])
+        return size, rate
+
+    def _playlist(self):
+        """Playlist HLS de fragmentos que reparten size"""
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        size, rate = self._params()
+        segments = max(1, int((query.get('segments') or [1])[0]))
+        base = parsed.path[:-len('.m3u8')]
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:10', '#EXT-X-MEDIA-SEQUENCE:0']
+        for i in range(segments):
+            part = size // segments + (1 if i < size % segments else 0)
+            lines += ['#EXTINF:10.0,', f'{base}-seg{i}.ts?size={part}&rate={rate}']
+        lines.append('#EXT-X-ENDLIST')
+        body = ('\n'.join(lines) + '\n').encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.apple.mpegurl')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        return body
+
+    def _range(self, size):
+        header = self.headers.get('Range')
+        match = re.match(r'bytes=(\d*)-(\d*)', header or '')
+        if not match:
+            return 0, size - 1, False
+        start = int(match.group(1) or 0)
+        end = int(match.group(2)) if match.group(2) else size - 1
+        return start, min(end, size - 1), True
+
+    def _headers(self, size):
+        start, end, partial = self._range(size)
+        self.send_response(206 if partial else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if partial:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        return start, end
+
+    def do_HEAD(self):
+        size, _ = self._params()
+        self._headers(size)
+
+    def do_GET(self):
+        if urlparse(self.path).path.endswith('.m3u8'):
+            self.wfile.write(self._playlist())
+            return
+        size, rate = self._params()
+        start, end = self._headers(size)
+        self.server.requests += 1
+        remaining = end - start + 1
+        block = b'\0' * CHUNK
+        began = time.monotonic()
+        sent = 0
+        try:
+            while remaining > 0:
+                n = min(CHUNK, remaining)
+                self.wfile.write(block[:n])
+                remaining -= n
+                sent += n
+                if rate:
+                    ahead = sent / rate - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.server.bytes_sent += sent
+
+
+class MediaServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        super().__init__(('127.0.0.1', port), _MediaHandler)
+        self.requests = 0
+        self.bytes_sent = 0
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def watch_url(self, video_id, size=8 * 1024 * 1024, rate=0, delay=0, segments=0):
+        """URL de 'video' que resuelve StubMediaIE"""
+        return f'{self.base_url}/watch/{video_id}?size={size}&rate={rate}&delay={delay}&segments={segments}'
+
+
+class StubMediaIE(InfoExtractor):
+    IE_NAME = 'stubmedia'
+    _VALID_URL = r'https?://127\.0\.0\.1:\d+/watch/(?P<id>[\w-]+)'
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        size = int((query.get('size') or [8 * 1024 * 1024])[0])
+        rate = (query.get('rate') or ['0'])[0]
+        delay = float((query.get('delay') or [0])[0])
+        segments = int((query.get('segments') or [0])[0])
+        if delay:
+            # Latencia simulada de la extracción (páginas, player JS...)
+            time.sleep(delay)
+
+        base = f'{parsed.scheme}://{parsed.netloc}/media/{video_id}'
+        audio_size = max(1, size // 8)
+        formats = [{
+            'format_id': 'audio-m4a',
+            'url': f'{base}-audio.m4a?size={audio_size}&rate={rate}',
+            'ext': 'm4a',
+            'acodec': 'mp4a.40.2',
+            'vcodec': 'none',
+            'abr': 128,
+            'filesize': audio_size,
+        }, {
+            'format_id': 'audio-opus',
+            'url': f'{base}-audio.webm?size={audio_size}&rate={rate}',
+            'ext': 'webm',
+            'acodec': 'opus',
+            'vcodec': 'none',
+            'abr': 160,
+            'filesize': audio_size,
+        }, {
+            'format_id': '360p',
+            'url': f'{base}-360.mp4?size={size // 2}&rate={rate}',
+            'ext': 'mp4',
+            'height': 360,
+            'vcodec': 'avc1.4d401e',
+            'acodec': 'mp4a.40.2',
+            'filesize': size // 2,
+        }, {
+            'format_id': '720p',
+            'url': f'{base}-720.mp4?size={size}&rate={rate}',
+            'ext': 'mp4',
+            'height': 720,
+            'vcodec': 'avc1.64001f',
+            'acodec': 'mp4a.40.2',
+            'filesize': size,
+        }]
+        if segments:
+            # Fragmentado como DASH/HLS: yt-dlp baja los fragmentos en paralelo
+            formats.append({
+                'format_id': 'hls-1080p',
+                'url': f'{base}-1080.m3u8?size={size}&rate={rate}&segments={segments}',
+                'protocol': 'm3u8_native',
+                'ext': 'mp4',
+                'height': 1080,
+                'vcodec': 'avc1.640028',
+                'acodec': 'mp4a.40.2',
+            })
+        return {
+            'id': video_id,
+            'title': f'Bench {video_id}',
+            'uploader': 'Benchmark',
+            'duration': 180,
+            'thumbnail': f'{base}.jpg',
+            'formats': formats,
+        }
+
+
+def install_stub_extractor(ydl):
+    """Registrar StubMediaIE con prioridad sobre el extractor genérico"""
+    ydl.add_info_extractor(StubMediaIE())
+    ydl._ies = {'StubMedia': ydl._ies.pop('StubMedia'), **ydl._ies}
+    return ydl
+
+
+def load_app(workdir, **env):
+    """Importar app.py aislado en workdir (base de datos, caché de yt-dlp y descargas)
+
+    app.py lee la configuración al importarse; env añade variables YTD_*.
+    """
+    os.environ['YTD_JOBS_DB'] = os.path.join(workdir, 'jobs.db')
+    os.environ['YTD_CACHE_DIR'] = os.path.join(workdir, 'ytdlp-cache')
+    for key, value in env.items():
+        os.environ.setdefault(key, str(value))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        app_module = importlib.import_module('app')
+    finally:
+        os.chdir(cwd)
+    patch_app(app_module)
+    return app_module
+
+
+def patch_app(app_module, quiet=True):
+    """Hacer que los pools de YoutubeDL de app.py reconozcan StubMediaIE"""
+    pools = app_module.ydl_pools
+    previous = pools.on_create
+
+    def on_create(ydl):
+        if previous:
+            previous(ydl)
+        install_stub_extractor(ydl)
+        if quiet:
+            ydl.params.update(quiet=True, noprogress=True)
+
+    pools.on_create = on_create
+    for name in list(pools._pools):
+        pool = pools[name]
+        pool.close()
+        pool.on_create = on_create
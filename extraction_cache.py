@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché compartido de yt-dlp (player JS, firmas y nsig)
+Todas las instancias del servidor y el CLI usan el mismo directorio 'cachedir'.
+ExtractionCacheStats instrumenta el caché de cada YoutubeDL para medir
+cuántas extracciones lo aprovechan y cuánto tiempo ahorra.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ytdlp-cache')
+
+
+def ytdlp_cache_dir():
+    """Directorio de caché de yt-dlp compartido por el servidor y el CLI"""
+    cache_dir = os.environ.get('YTD_CACHE_DIR') or DEFAULT_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+class ExtractionCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.loads_hit = 0
+        self.loads_miss = 0
+        self.stores = 0
+        self.warm_count = 0
+        self.warm_seconds = 0.0
+        self.cold_count = 0
+        self.cold_seconds = 0.0
+
+    def instrument(self, ydl):
+        """Contar lecturas y escrituras del caché de una instancia YoutubeDL"""
+        cache = ydl.cache
+        original_load, original_store = cache.load, cache.store
+
+        def load(section, key, *args, **kwargs):
+            default = kwargs.get('default', args[1] if len(args) > 1 else None)
+            result = original_load(section, key, *args, **kwargs)
+            hit = result is not default
+            with self._lock:
+                if hit:
+                    self.loads_hit += 1
+                else:
+                    self.loads_miss += 1
+            self._bump('hits' if hit else 'misses')
+            return result
+
+        def store(section, key, *args, **kwargs):
+            with self._lock:
+                self.stores += 1
+            self._bump('stores')
+            return original_store(section, key, *args, **kwargs)
+
+        cache.load, cache.store = load, store
+        return ydl
+
+    def _bump(self, name):
+        counters = getattr(self._local, 'counters', None)
+        if counters is not None:
+            counters[name] += 1
+
+    @contextmanager
+    def measure(self):
+        """Cronometrar una extracción y clasificarla como fría (escribió caché) o caliente"""
+        counters = self._local.counters = {'hits': 0, 'misses': 0, 'stores': 0}
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.counters = None
+            with self._lock:
+                if counters['stores'] or counters['misses']:
+                    self.cold_count += 1
+                    self.cold_seconds += elapsed
+                elif counters['hits']:
+                    self.warm_count += 1
+                    self.warm_seconds += elapsed
+
+    def stats(self):
+        with self._lock:
+            avg_cold = self.cold_seconds / self.cold_count if self.cold_count else None
+            avg_warm = self.warm_seconds / self.warm_count if self.warm_count else None
+            saved = None
+            if avg_cold is not None and avg_warm is not None:
+                saved = max(0.0, avg_cold - avg_warm) * self.warm_count
+            return {
+                'loads_hit': self.loads_hit,
+                'loads_miss': self.loads_miss,
+                'stores': self.stores,
+                'cold_extractions': self.cold_count,
+                'warm_extractions': self.warm_count,
+                'avg_cold_ms': round(avg_cold * 1000, 1) if avg_cold is not None else None,
+                'avg_warm_ms': round(avg_warm * 1000, 1) if avg_warm is not None else None,
+                'estimated_saved_seconds': round(saved, 3) if saved is not None else None,
+            }
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Configuración de gunicorn para producción
+gunicorn la lee del directorio actual: gunicorn -w 4 app:app
+Cada worker ejecuta las tareas de arranque de app.py al quedar listo
+(precalentar yt-dlp y reanudar descargas). Un worker solo reanuda las
+descargas de workers caídos, nunca las que ejecuta otro vivo; con
+YTD_MULTIPROCESS=1 los workers comparten además el estado de las descargas.
+"""
+
+bind = '0.0.0.0:5000'
+
+
+def post_worker_init(worker):
+    """Tareas de arranque de app.py en el worker ya cargado"""
+    import app
+    app.start_server()
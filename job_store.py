@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Almacenamiento persistente de descargas
+Guarda el estado de cada descarga en SQLite con retención por antigüedad y
+cantidad, y mantiene en memoria solo un número acotado de entradas recientes.
+Varios procesos pueden compartir la base (WAL): cada descarga registra el
+worker que la ejecuta, los workers publican un latido y las cancelaciones
+pedidas desde otro proceso quedan marcadas en la fila.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+TERMINAL_STATUSES = ('completed', 'error')
+
+# Campos del registro que solo usa el servidor (rutas, petición original)
+PRIVATE_FIELDS = ('download_id', 'filepath', 'filepaths', 'job_key', 'request', 'parent_id')
+
+
+class JobStore:
+    def __init__(self, path, max_age_days=7, max_jobs=5000, prune_every=200):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.max_jobs = max_jobs
+        self.prune_every = prune_every
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=10000')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                download_id TEXT PRIMARY KEY,
+                job_key TEXT,
+                status TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_updated ON jobs(updated_at);
+            CREATE INDEX IF NOT EXISTS jobs_key ON jobs(job_key);
+            CREATE TABLE IF NOT EXISTS batches (
+                batch_id TEXT PRIMARY KEY,
+                download_ids TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS workers (
+                owner TEXT PRIMARY KEY,
+                pid INTEGER,
+                heartbeat_at REAL NOT NULL
+            );
+        ''')
+        # Bases creadas antes del modo multiproceso
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'owner' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+        if 'cancel_requested' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0')
+
+    # Un estado final no se pisa con uno intermedio escrito tarde por otro hilo
+    _UPSERT = f'''
+        INSERT INTO jobs (download_id, job_key, status, data, created_at, updated_at, owner)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(download_id) DO UPDATE SET
+            job_key = COALESCE(excluded.job_key, jobs.job_key),
+            status = excluded.status,
+            data = excluded.data,
+            updated_at = excluded.updated_at,
+            owner = COALESCE(excluded.owner, jobs.owner)
+        WHERE jobs.status NOT IN {TERMINAL_STATUSES} OR excluded.status IN {TERMINAL_STATUSES}
+    '''
+
+    def save(self, download_id, data, job_key=None, owner=None):
+        """Insertar o actualizar el estado de una descarga"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(self._UPSERT, (download_id, job_key, data.get('status', ''),
+                                              json.dumps(data), now, now, owner))
+            self._writes += 1
+            if self.prune_every and self._writes % self.prune_every == 0:
+                self._prune_locked()
+
+    def save_many(self, items, batch=None, owner=None):
+        """Guardar varias descargas (download_id, data, job_key) en una sola transacción.
+
+        batch (batch_id, download_ids) guarda además un lote con sus IDs en orden.
+        """
+        now = time.time()
+        rows = [(download_id, job_key, data.get('status', ''), json.dumps(data), now, now, owner)
+                for download_id, data, job_key in items]
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(self._UPSERT, rows)
+                if batch is not None:
+                    self._conn.execute(
+                        'INSERT INTO batches (batch_id, download_ids, created_at) VALUES (?, ?, ?)',
+                        (batch[0], json.dumps(batch[1]), now))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._writes += len(rows)
+
+    def delete_many(self, download_ids):
+        with self._lock:
+            self._conn.executemany('DELETE FROM jobs WHERE download_id = ?', [(i,) for i in download_ids])
+
+    def load_many(self, download_ids):
+        """Últimos estados de varias descargas como {download_id: data}"""
+        records = {}
+        download_ids = list(download_ids)
+        with self._lock:
+            # SQLite limita la cantidad de parámetros por consulta
+            for start in range(0, len(download_ids), 500):
+                chunk = download_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f'SELECT download_id, data FROM jobs WHERE download_id IN ({",".join("?" * len(chunk))})',
+                    chunk).fetchall()
+                records.update((download_id, json.loads(data)) for download_id, data in rows)
+        return records
+
+    def load_batch(self, batch_id):
+        """IDs de descarga de un lote, en el orden del manifiesto, o None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT download_ids FROM batches WHERE batch_id = ?', (batch_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load(self, download_id):
+        """Último estado guardado de una descarga, o None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM jobs WHERE download_id = ?', (download_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_key(self, job_key, status='completed'):
+        """Descarga más reciente con la misma clave de contenido y estado"""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT data FROM jobs WHERE job_key = ? AND status = ?
+                ORDER BY updated_at DESC LIMIT 1
+            ''', (job_key, status)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def unfinished(self):
+        """Descargas que no llegaron a un estado final"""
+        placeholders = ','.join('?' * len(TERMINAL_STATUSES))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT data FROM jobs WHERE status NOT IN ({placeholders}) ORDER BY created_at',
+                TERMINAL_STATUSES).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def heartbeat(self, owner, pid):
+        """Registrar que el worker owner sigue vivo"""
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO workers (owner, pid, heartbeat_at) VALUES (?, ?, ?)
+                ON CONFLICT(owner) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+            ''', (owner, pid, time.time()))
+
+    def retire(self, owner):
+        """Quitar un worker que se apaga ordenadamente"""
+        with self._lock:
+            self._conn.execute('DELETE FROM workers WHERE owner = ?', (owner,))
+
+    def workers(self, stale_after=None):
+        """Workers con latido reciente (todos si stale_after es None) como [{owner, pid, heartbeat_at}]"""
+        since = float('-inf') if stale_after is None else time.time() - stale_after
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT owner, pid, heartbeat_at FROM workers WHERE heartbeat_at >= ? ORDER BY owner',
+                (since,)).fetchall()
+        return [{'owner': owner, 'pid': pid, 'heartbeat_at': heartbeat_at} for owner, pid, heartbeat_at in rows]
+
+    def claim_orphans(self, owner, stale_after):
+        """Adueñarse de las descargas sin terminar cuyo worker ya no da latidos.
+
+        La transacción es exclusiva, así que dos workers nunca reclaman la
+        misma descarga. Cada registro lleva cancel_requested.
+        """
+        placeholders = ','.join('?' * len(TERMINAL_STATUSES))
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(f'''
+                    SELECT download_id, data, cancel_requested FROM jobs
+                    WHERE status NOT IN ({placeholders}) AND (owner IS NULL OR owner NOT IN (
+                        SELECT owner FROM workers WHERE heartbeat_at >= ?
+                    ))
+                    ORDER BY created_at
+                ''', (*TERMINAL_STATUSES, time.time() - stale_after)).fetchall()
+                self._conn.executemany('UPDATE jobs SET owner = ? WHERE download_id = ?',
+                                       [(owner, download_id) for download_id, _, _ in rows])
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return [dict(json.loads(data), cancel_requested=bool(flag)) for _, data, flag in rows]
+
+    def request_cancel(self, download_id):
+        """Marcar una descarga sin terminar para que su worker la cancele"""
+        placeholders = ','.join('?' * len(TERMINAL_STATUSES))
+        with self._lock:
+            return self._conn.execute(
+                f'UPDATE jobs SET cancel_requested = 1 WHERE download_id = ? AND status NOT IN ({placeholders})',
+                (download_id, *TERMINAL_STATUSES)).rowcount > 0
+
+    def cancel_requests(self, download_ids):
+        """IDs, de entre download_ids, con una cancelación pendiente"""
+        found = []
+        download_ids = list(download_ids)
+        with self._lock:
+            for start in range(0, len(download_ids), 500):
+                chunk = download_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f'SELECT download_id FROM jobs WHERE cancel_requested = 1 '
+                    f'AND download_id IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+                found.extend(row[0] for row in rows)
+        return found
+
+    def find_active_by_key(self, job_key, stale_after):
+        """Descarga sin terminar con la misma clave que ejecuta un worker vivo"""
+        placeholders = ','.join('?' * len(TERMINAL_STATUSES))
+        with self._lock:
+            row = self._conn.execute(f'''
+                SELECT data FROM jobs WHERE job_key = ? AND status NOT IN ({placeholders})
+                AND owner IN (SELECT owner FROM workers WHERE heartbeat_at >= ?)
+                ORDER BY updated_at DESC LIMIT 1
+            ''', (job_key, *TERMINAL_STATUSES, time.time() - stale_after)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def prune(self):
+        """Aplicar la retención por antigüedad y por cantidad"""
+        with self._lock:
+            return self._prune_locked()
+
+    def _prune_locked(self):
+        removed = 0
+        placeholders = ','.join('?' * len(TERMINAL_STATUSES))
+        if self.max_age:
+            removed += self._conn.execute(
+                f'DELETE FROM jobs WHERE updated_at < ? AND status IN ({placeholders})',
+                (time.time() - self.max_age, *TERMINAL_STATUSES)).rowcount
+            self._conn.execute('DELETE FROM batches WHERE created_at < ?', (time.time() - self.max_age,))
+            self._conn.execute('DELETE FROM workers WHERE heartbeat_at < ?', (time.time() - self.max_age,))
+        if self.max_jobs:
+            removed += self._conn.execute(f'''
+                DELETE FROM jobs WHERE status IN ({placeholders}) AND download_id NOT IN (
+                    SELECT download_id FROM jobs ORDER BY updated_at DESC LIMIT ?
+                )
+            ''', (*TERMINAL_STATUSES, self.max_jobs)).rowcount
+        return removed
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+
+class ProgressRegistry:
+    """Diccionario de progresos en memoria con desalojo de las descargas terminadas.
+
+    Las descargas activas nunca se desalojan; de las terminadas solo se
+    conservan las max_hot más recientes, el resto queda en el JobStore.
+    """
+
+    def __init__(self, store, max_hot=500, owner=None):
+        self.store = store
+        self.max_hot = max_hot
+        self.owner = owner
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __setitem__(self, download_id, progress):
+        with self._lock:
+            self._entries[download_id] = progress
+            self._entries.move_to_end(download_id)
+
+    def __getitem__(self, download_id):
+        with self._lock:
+            return self._entries[download_id]
+
+    def __contains__(self, download_id):
+        with self._lock:
+            return download_id in self._entries
+
+    def __delitem__(self, download_id):
+        with self._lock:
+            del self._entries[download_id]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, download_id, default=None):
+        with self._lock:
+            return self._entries.get(download_id, default)
+
+    def values(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def persist_many(self, progresses, batch=None):
+        """Guardar varias descargas nuevas (y su lote) en una sola transacción"""
+        self.store.save_many([(progress.download_id, progress.to_record(), progress.job_key)
+                              for progress in progresses], batch, self.owner)
+
+    def persist(self, progress, job_key=None):
+        """Guardar el estado en disco y desalojar terminadas si sobran"""
+        self.store.save(progress.download_id, progress.to_record(), job_key, self.owner)
+        if progress.status in TERMINAL_STATUSES:
+            self._evict()
+
+    def snapshot(self, download_id):
+        """Estado de una descarga desde memoria o, si fue desalojada, desde disco"""
+        progress = self.get(download_id)
+        if progress is not None:
+            return progress.to_dict()
+        record = self.store.load(download_id)
+        if record is not None:
+            for key in PRIVATE_FIELDS:
+                record.pop(key, None)
+        return record
+
+    def _evict(self):
+        with self._lock:
+            finished = [download_id for download_id, progress in self._entries.items()
+                        if progress.status in TERMINAL_STATUSES and progress.parent is None]
+            for download_id in finished[:max(0, len(finished) - self.max_hot)]:
+                progress = self._entries.pop(download_id)
+                for child in getattr(progress, 'children', ()):
+                    self._entries.pop(child.download_id, None)
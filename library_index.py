@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de la biblioteca de descargas
+Mantiene en memoria los archivos de la carpeta de descargas. Se actualiza
+cuando termina una descarga y se reconcilia con os.scandir solo cuando cambia
+el mtime de la carpeta (o cada cierto intervalo), de modo que listar no
+cuesta un stat por archivo en cada petición. Con descargas en curso el mtime
+cambia a cada rato, así que esos reescaneos se espacian al menos
+min_rescan_interval segundos.
+"""
+
+import base64
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.opus', '.ogg', '.aac', '.flac', '.wav')
+
+# Archivos intermedios de yt-dlp/ffmpeg que no forman parte de la biblioteca
+PARTIAL_MARKERS = ('.part', '.ytdl', '.temp.', '-Frag')
+
+SORT_FIELDS = ('modified', 'name', 'size')
+
+
+def file_type(filename):
+    return 'audio' if filename.lower().endswith(AUDIO_EXTENSIONS) else 'video'
+
+
+def is_partial(filename):
+    return filename.startswith('.') or any(marker in filename for marker in PARTIAL_MARKERS)
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return tuple(json.loads(base64.urlsafe_b64decode(padded.encode())))
+
+
+class LibraryIndex:
+    def __init__(self, folder, rescan_interval=300, min_rescan_interval=2):
+        self.folder = folder
+        self.rescan_interval = rescan_interval
+        self.min_rescan_interval = min_rescan_interval
+
+        self._lock = threading.Lock()
+        self._files = {}
+        self._dir_mtime = None
+        self._last_scan = 0.0
+        self._sorted = {}
+
+        # La generación distingue ETags entre reinicios del proceso
+        self.generation = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.scans = 0
+
+    @property
+    def etag(self):
+        return f'lib-{self.generation}-{self.version}'
+
+    def add(self, path):
+        """Registrar (o actualizar) un archivo recién terminado"""
+        path = os.path.abspath(path)
+        if os.path.dirname(path) != os.path.abspath(self.folder):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._set_locked(os.path.basename(path), stat.st_size, stat.st_mtime)
+
+    def discard(self, path):
+        with self._lock:
+            if self._files.pop(os.path.basename(path), None) is not None:
+                self._changed_locked()
+
+    def reconcile(self, force=False):
+        """Reescanear la carpeta si su mtime cambió (como mucho cada min_rescan_interval) o venció el intervalo"""
+        try:
+            dir_mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            dir_mtime = None
+
+        with self._lock:
+            since = time.monotonic() - self._last_scan
+            stale = since >= self.rescan_interval
+            changed = dir_mtime != self._dir_mtime and since >= self.min_rescan_interval
+            if not force and not stale and not changed:
+                return False
+
+        files = {}
+        if dir_mtime is not None:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if is_partial(entry.name):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files[entry.name] = (stat.st_size, stat.st_mtime)
+
+        with self._lock:
+            self._dir_mtime = dir_mtime
+            self._last_scan = time.monotonic()
+            self.scans += 1
+            current = {name: (entry['size'], entry['mtime']) for name, entry in self._files.items()}
+            if current != files:
+                self._files = {}
+                for name, (size, mtime) in files.items():
+                    self._files[name] = self._entry(name, size, mtime)
+                self._changed_locked()
+        return True
+
+    def query(self, sort='modified', order='desc', type_filter=None,
+              min_size=None, max_size=None, limit=100, cursor=None):
+        """Página de archivos ordenada y filtrada; devuelve (archivos, siguiente_cursor, total)"""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f'Orden no válido: {sort}')
+        descending = order != 'asc'
+
+        def matches(entry):
+            if type_filter and entry['type'] != type_filter:
+                return False
+            if min_size is not None and entry['size'] < min_size:
+                return False
+            if max_size is not None and entry['size'] > max_size:
+                return False
+            return True
+
+        with self._lock:
+            keys, entries = self._sorted_locked(sort)
+
+        if cursor:
+            key = decode_cursor(cursor)
+            if descending:
+                indexes = range(bisect.bisect_left(keys, key) - 1, -1, -1)
+            else:
+                indexes = range(bisect.bisect_right(keys, key), len(keys))
+        else:
+            indexes = range(len(keys) - 1, -1, -1) if descending else range(len(keys))
+
+        page = []
+        next_cursor = None
+        for i in indexes:
+            entry = entries[i]
+            if not matches(entry):
+                continue
+            if len(page) == limit:
+                next_cursor = encode_cursor(keys[page[-1]])
+                break
+            page.append(i)
+
+        filtered = type_filter or min_size is not None or max_size is not None
+        total = sum(1 for entry in entries if matches(entry)) if filtered else len(entries)
+        return [self._public(entries[i]) for i in page], next_cursor, total
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'version': self.version,
+                'scans': self.scans,
+            }
+
+    def _entry(self, name, size, mtime):
+        return {'name': name, 'size': size, 'mtime': mtime, 'type': file_type(name)}
+
+    def _set_locked(self, name, size, mtime):
+        if is_partial(name):
+            return
+        entry = self._files.get(name)
+        if entry and entry['size'] == size and entry['mtime'] == mtime:
+            return
+        self._files[name] = self._entry(name, size, mtime)
+        self._changed_locked()
+
+    def _changed_locked(self):
+        self.version += 1
+        self._sorted.clear()
+
+    def _sorted_locked(self, sort):
+        cached = self._sorted.get(sort)
+        if cached is None:
+            field = 'mtime' if sort == 'modified' else sort
+            entries = sorted(self._files.values(), key=lambda e: (e[field], e['name']))
+            keys = [(e[field], e['name']) for e in entries]
+            cached = self._sorted[sort] = (keys, entries)
+        return cached
+
+    @staticmethod
+    def _public(entry):
+        return {
+            'name': entry['name'],
+            'size': entry['size'],
+            'modified': datetime.fromtimestamp(entry['mtime']).isoformat(),
+            'type': entry['type'],
+        }
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché de metadatos de videos
+LRU con expiración (TTL), caché negativo para fallos y "single-flight":
+varias peticiones simultáneas de la misma clave comparten una sola extracción.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+YOUTUBE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def video_cache_key(url):
+    """Normalizar una URL de YouTube a una clave estable basada en el ID del video"""
+    url = (url or '').strip()
+    try:
+        parsed = urlparse(url if '://' in url else 'https://' + url)
+    except ValueError:
+        return url
+
+    host = (parsed.hostname or '').lower()
+    path_parts = [p for p in parsed.path.split('/') if p]
+    video_id = None
+
+    if host.endswith('youtu.be'):
+        video_id = path_parts[0] if path_parts else None
+    elif host.endswith('youtube.com') or host.endswith('youtube-nocookie.com'):
+        query = parse_qs(parsed.query)
+        if path_parts[:1] == ['watch']:
+            video_id = (query.get('v') or [None])[0]
+        elif len(path_parts) >= 2 and path_parts[0] in ('shorts', 'embed', 'live', 'v'):
+            video_id = path_parts[1]
+        elif path_parts[:1] == ['playlist'] and query.get('list'):
+            return f"youtube:playlist:{query['list'][0]}"
+
+    if video_id and YOUTUBE_ID_RE.match(video_id):
+        return f"youtube:{video_id}"
+    return url
+
+
+def playlist_cache_key(url):
+    """Clave de la playlist referida por la URL (parámetro list=), o None si no hay"""
+    try:
+        parsed = urlparse(url if '://' in url else 'https://' + url)
+    except ValueError:
+        return None
+    host = (parsed.hostname or '').lower()
+    if not (host.endswith('youtube.com') or host.endswith('youtu.be')):
+        return None
+    playlist_id = (parse_qs(parsed.query).get('list') or [None])[0]
+    return f"youtube:playlist:{playlist_id}" if playlist_id else None
+
+
+class _Flight:
+    __slots__ = ('event', 'value')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class MetadataCache:
+    def __init__(self, maxsize=256, ttl=600, negative_ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.collapsed = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, loader):
+        """Devolver el valor cacheado o ejecutar loader() una sola vez por clave.
+
+        loader() debe devolver None para indicar fallo (se cachea negativamente).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    if value is None:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    return value
+                del self._entries[key]
+
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.collapsed += 1
+                leader = False
+            else:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            return flight.value
+
+        value = None
+        try:
+            value = loader()
+        finally:
+            with self._lock:
+                ttl = self.ttl if value is not None else self.negative_ttl
+                if ttl > 0:
+                    self._entries[key] = (time.monotonic() + ttl, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+                del self._inflight[key]
+            flight.value = value
+            flight.event.set()
+        return value
+
+    def invalidate(self, key=None):
+        """Borrar una clave o todo el caché"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses + self.collapsed
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'negative_ttl': self.negative_ttl,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'collapsed': self.collapsed,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.negative_hits + self.collapsed) / lookups, 4) if lookups else 0.0,
+            }
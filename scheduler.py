@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planificador de descargas con concurrencia limitada
+Cola con prioridad (FIFO dentro de la misma prioridad), límite global de
+trabajadores y límite de descargas simultáneas por host. Cada host tiene su
+propia cola; solo las cabezas de los hosts con espacio compiten por un
+trabajador, así que despachar no recorre los trabajos de hosts saturados.
+StagePool ejecuta etapas de CPU (conversión con ffmpeg) fuera de los
+espacios de descarga.
+"""
+
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+
+class QueueFullError(Exception):
+    """La cola de descargas alcanzó su capacidad máxima"""
+
+
+def host_from_url(url):
+    """Obtener el host de una URL para aplicar el límite por host"""
+    try:
+        host = (urlparse(url).hostname or '').lower()
+    except ValueError:
+        host = ''
+    # youtu.be, m.youtube.com y www.youtube.com comparten el mismo origen
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    if host == 'youtu.be':
+        host = 'youtube.com'
+    return host
+
+
+class _Job:
+    __slots__ = ('job_id', 'func', 'args', 'host', 'priority', 'seq', 'thread')
+
+    def __init__(self, job_id, func, args, host, priority, seq):
+        self.job_id = job_id
+        self.func = func
+        self.args = args
+        self.host = host
+        self.priority = priority
+        self.seq = seq
+        self.thread = None
+
+    def __lt__(self, other):
+        # Mayor prioridad primero; a igual prioridad, orden de llegada
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+
+class DownloadScheduler:
+    def __init__(self, max_workers=3, max_queue=100, per_host_limit=None):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        # Sin límite propio, un host puede usar todos los trabajadores
+        self.per_host_limit = max(1, int(per_host_limit or self.max_workers))
+
+        self._lock = threading.Lock()
+        self._host_heaps = {}   # host -> trabajos en cola de ese host
+        self._ready = []        # cabezas de hosts con espacio (puede tener entradas viejas)
+        self._queued = {}
+        self._running = {}
+        self._host_running = {}
+        self._seq = itertools.count()
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, job_id, func, args=(), url=None, priority=0):
+        """Encolar un trabajo; lanza QueueFullError si la cola está llena"""
+        with self._lock:
+            if len(self._queued) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError('Cola de descargas llena, intenta más tarde')
+
+            job = _Job(job_id, func, tuple(args), host_from_url(url or ''),
+                       int(priority), next(self._seq))
+            self._queued[job_id] = job
+            heapq.heappush(self._host_heaps.setdefault(job.host, []), job)
+            self._offer_locked(job.host)
+            self._dispatch_locked()
+
+    def submit_many(self, jobs, max_queue=None):
+        """Encolar varios trabajos (job_id, func, args, url, priority) todos o ninguno"""
+        limit = self.max_queue if max_queue is None else max_queue
+        with self._lock:
+            if len(self._queued) + len(jobs) > limit:
+                self.rejected += len(jobs)
+                raise QueueFullError(f'No hay espacio en la cola para {len(jobs)} descargas, intenta más tarde')
+
+            hosts = set()
+            for job_id, func, args, url, priority in jobs:
+                job = _Job(job_id, func, tuple(args), host_from_url(url or ''),
+                           int(priority), next(self._seq))
+                self._queued[job_id] = job
+                self._host_heaps.setdefault(job.host, []).append(job)
+                hosts.add(job.host)
+            for host in hosts:
+                heapq.heapify(self._host_heaps[host])
+                self._offer_locked(host)
+            self._dispatch_locked()
+
+    def cancel(self, job_id):
+        """Quitar un trabajo de la cola si todavía no empezó"""
+        with self._lock:
+            job = self._queued.pop(job_id, None)
+            if job is None:
+                return False
+            heap = self._host_heaps[job.host]
+            heap.remove(job)
+            heapq.heapify(heap)
+            if heap:
+                self._offer_locked(job.host)
+            else:
+                del self._host_heaps[job.host]
+            return True
+
+    def release(self, job_id):
+        """Liberar el espacio de un trabajo en ejecución antes de que su hilo termine"""
+        with self._lock:
+            if self._release_locked(job_id):
+                self._dispatch_locked()
+
+    def is_queued(self, job_id):
+        with self._lock:
+            return job_id in self._queued
+
+    def is_running(self, job_id):
+        with self._lock:
+            return job_id in self._running
+
+    def position(self, job_id):
+        """Posición (1..n) de un trabajo en la cola, o None si no está encolado"""
+        with self._lock:
+            job = self._queued.get(job_id)
+            if job is None:
+                return None
+            return 1 + sum(1 for other in self._queued.values() if other < job)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': len(self._running),
+                'queued': len(self._queued),
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'per_host_limit': self.per_host_limit,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+            }
+
+    def _release_locked(self, job_id):
+        job = self._running.pop(job_id, None)
+        if job is None:
+            return False
+        remaining = self._host_running.get(job.host, 1) - 1
+        if remaining > 0:
+            self._host_running[job.host] = remaining
+        else:
+            self._host_running.pop(job.host, None)
+        # El host vuelve a tener espacio: su cabeza compite otra vez
+        self._offer_locked(job.host)
+        return True
+
+    def _offer_locked(self, host):
+        """Poner la cabeza de host entre las candidatas si el host tiene espacio"""
+        heap = self._host_heaps.get(host)
+        if heap and self._host_running.get(host, 0) < self.per_host_limit:
+            heapq.heappush(self._ready, heap[0])
+
+    def _dispatch_locked(self):
+        """Arrancar trabajos elegibles mientras haya espacios libres"""
+        while self._ready and len(self._running) < self.max_workers:
+            job = heapq.heappop(self._ready)
+            heap = self._host_heaps.get(job.host)
+            # Entradas viejas: el trabajo ya salió, dejó de ser la cabeza o el host se llenó
+            if not heap or heap[0] is not job or self._host_running.get(job.host, 0) >= self.per_host_limit:
+                continue
+
+            heapq.heappop(heap)
+            if not heap:
+                del self._host_heaps[job.host]
+            del self._queued[job.job_id]
+            self._running[job.job_id] = job
+            self._host_running[job.host] = self._host_running.get(job.host, 0) + 1
+            self._offer_locked(job.host)
+            job.thread = threading.Thread(target=self._run, args=(job,), daemon=True)
+            job.thread.start()
+
+    def _run(self, job):
+        ok = False
+        try:
+            job.func(*job.args)
+            ok = True
+        except Exception as e:
+            print(f"Error en trabajo {job.job_id}: {e}")
+        finally:
+            with self._lock:
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._release_locked(job.job_id)
+                self._dispatch_locked()
+
+
+class StagePool:
+    """Pool de hilos de tamaño fijo para una etapa del pipeline (p. ej. ffmpeg)"""
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _call(self, func, args):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        ok = False
+        try:
+            result = func(*args)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.running -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def submit(self, func, *args):
+        with self._lock:
+            self.queued += 1
+        future = self._executor.submit(self._call, func, args)
+        future.add_done_callback(self._discard_cancelled)
+        return future
+
+    def _discard_cancelled(self, future):
+        # Un trabajo cancelado antes de empezar no pasa por _call
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def run(self, func, *args):
+        """Ejecutar en el pool y esperar el resultado (las excepciones se propagan)"""
+        return self.submit(func, *args).result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'queued': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+            }
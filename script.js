@@ -4,6 +4,7 @@ class YouTubeDownloader {
     constructor() {
         this.currentDownload = null;
         this.downloadInterval = null;
+        this.progressSource = null;
         this.currentVideoInfo = null;
         this.init();
     }
@@ -289,6 +290,34 @@ class YouTubeDownloader {
     }
 
     startProgressTracking() {
+        if (!this.currentDownload) return;
+
+        // Preferir Server-Sent Events; si no están disponibles, volver al polling
+        if (!('EventSource' in window)) {
+            this.startProgressPolling();
+            return;
+        }
+
+        const downloadId = this.currentDownload;
+        const source = new EventSource(`http://localhost:5000/api/progress/${downloadId}/stream`);
+        this.progressSource = source;
+
+        source.onmessage = (event) => {
+            if (this.currentDownload !== downloadId) return;
+            this.handleProgress(JSON.parse(event.data));
+        };
+
+        source.onerror = () => {
+            // El stream terminó o falló antes de completar: seguir con polling
+            source.close();
+            this.progressSource = null;
+            if (this.currentDownload === downloadId && !this.downloadInterval) {
+                this.startProgressPolling();
+            }
+        };
+    }
+
+    startProgressPolling() {
         this.downloadInterval = setInterval(async () => {
             if (!this.currentDownload) return;
 
@@ -297,13 +326,7 @@ class YouTubeDownloader {
                 const data = await response.json();
 
                 if (data.success) {
-                    this.updateProgress(data.progress);
-                    
-                    if (data.progress.status === 'completed') {
-                        this.downloadCompleted(data.progress);
-                    } else if (data.progress.status === 'error') {
-                        this.downloadError(data.progress.error);
-                    }
+                    this.handleProgress(data.progress);
                 }
             } catch (error) {
                 console.error('Error tracking progress:', error);
@@ -311,6 +334,27 @@ class YouTubeDownloader {
         }, 1000);
     }
 
+    stopProgressTracking() {
+        if (this.progressSource) {
+            this.progressSource.close();
+            this.progressSource = null;
+        }
+        if (this.downloadInterval) {
+            clearInterval(this.downloadInterval);
+            this.downloadInterval = null;
+        }
+    }
+
+    handleProgress(progress) {
+        this.updateProgress(progress);
+
+        if (progress.status === 'completed') {
+            this.downloadCompleted(progress);
+        } else if (progress.status === 'error') {
+            this.downloadError(progress.error);
+        }
+    }
+
     updateProgress(progress) {
         const statusText = document.getElementById('status-text');
         const progressText = document.getElementById('progress-text');
@@ -321,7 +365,11 @@ class YouTubeDownloader {
         const timeRemaining = document.getElementById('timeRemaining');
 
         // Actualizar elementos principales de progreso
-        if (statusText) statusText.textContent = progress.status_text || 'Descargando...';
+        if (statusText) {
+            statusText.textContent = progress.status === 'queued' && progress.queue_position
+                ? `En cola (posición ${progress.queue_position})...`
+                : progress.status_text || 'Descargando...';
+        }
         if (progressText) progressText.textContent = `${Math.round(progress.percentage || 0)}%`;
         if (speedText) speedText.textContent = progress.speed || '--';
         if (etaText) etaText.textContent = progress.eta || '--';
@@ -333,7 +381,7 @@ class YouTubeDownloader {
     }
 
     downloadCompleted(progress) {
-        clearInterval(this.downloadInterval);
+        this.stopProgressTracking();
         this.currentDownload = null;
         
         document.getElementById('progressSection').style.display = 'none';
@@ -348,7 +396,7 @@ class YouTubeDownloader {
     }
 
     downloadError(error) {
-        clearInterval(this.downloadInterval);
+        this.stopProgressTracking();
         this.currentDownload = null;
         
         document.getElementById('progressSection').style.display = 'none';
@@ -363,7 +411,7 @@ class YouTubeDownloader {
                 method: 'POST'
             });
             
-            clearInterval(this.downloadInterval);
+            this.stopProgressTracking();
             this.currentDownload = null;
             
             document.getElementById('progressSection').style.display = 'none';
@@ -394,9 +442,7 @@ class YouTubeDownloader {
         this.currentVideoInfo = null;
         this.currentDownload = null;
         
-        if (this.downloadInterval) {
-            clearInterval(this.downloadInterval);
-        }
+        this.stopProgressTracking();
     }
 
     async openDownloadFolder() {
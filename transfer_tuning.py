@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ajuste adaptativo de conexiones por descarga
+Para cada host y tipo de tráfico (audio, video) elige cuántos fragmentos
+(DASH/HLS) bajar en paralelo y el tamaño de chunk HTTP a partir del
+rendimiento observado en descargas anteriores. Las conexiones de todas las
+descargas comparten un presupuesto global; cada descarga tiene siempre al
+menos una, y una descarga HTTP simple devuelve las demás al empezar.
+"""
+
+import threading
+
+from scheduler import host_from_url
+
+FRAGMENT_LEVELS = (1, 2, 4, 8, 16)
+
+MB = 1024 * 1024
+
+
+class _HostStats:
+    __slots__ = ('throughput', 'per_connection', 'fragmented', 'jobs')
+
+    def __init__(self):
+        self.throughput = {}        # fragmentos -> bytes/s (media móvil)
+        self.per_connection = None  # bytes/s por conexión (media móvil)
+        self.fragmented = None      # None hasta ver la primera descarga
+        self.jobs = 0
+
+
+class TransferPlan:
+    """Ajustes de una descarga; hook() mide bytes y tiempo al terminar cada archivo"""
+
+    def __init__(self, tuner, key, fragments, chunk_size):
+        self.tuner = tuner
+        self.key = key
+        self.fragments = fragments
+        self.reserved = fragments   # conexiones tomadas del presupuesto
+        self.chunk_size = chunk_size
+        self.bytes = 0
+        self.seconds = 0.0
+        self.fragmented = False
+        self.started = False
+        self.throughput = None
+
+    def ydl_opts(self):
+        return {
+            'concurrent_fragment_downloads': self.fragments,
+            'http_chunk_size': self.chunk_size,
+        }
+
+    def hook(self, d):
+        """progress hook de yt-dlp (se llama por bloque: mantenerlo barato)"""
+        status = d['status']
+        if status == 'downloading':
+            if not self.fragmented and d.get('fragment_count'):
+                self.fragmented = True
+            if not self.started:
+                self.started = True
+                # HTTP simple: una sola conexión, el resto vuelve al presupuesto
+                if not self.fragmented:
+                    self.tuner.release_extra(self)
+        elif status == 'finished' and d.get('elapsed'):
+            self.bytes += d.get('total_bytes') or d.get('downloaded_bytes') or 0
+            self.seconds += d['elapsed']
+
+    def to_dict(self):
+        return {
+            'fragments': self.fragments,
+            'connections': self.reserved,
+            'chunk_size': self.chunk_size,
+            'fragmented': self.fragmented,
+            'throughput_bps': round(self.throughput) if self.throughput else None,
+        }
+
+
+class TransferTuner:
+    def __init__(self, max_connections=16, max_fragments=8, initial_fragments=4,
+                 chunk_seconds=4, min_chunk=MB, max_chunk=64 * MB, default_chunk=10 * MB,
+                 explore_every=10, alpha=0.3):
+        self.max_connections = max(1, int(max_connections))
+        self.levels = tuple(level for level in FRAGMENT_LEVELS if level <= max(1, max_fragments))
+        self.initial_fragments = max(level for level in self.levels if level <= max(1, initial_fragments))
+        self.chunk_seconds = chunk_seconds
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.default_chunk = default_chunk
+        self.explore_every = explore_every
+        self.alpha = alpha
+
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self.in_use = 0
+
+    def plan(self, url, traffic_class=''):
+        """Reservar conexiones del presupuesto y elegir fragmentos y chunk para url.
+
+        Lo aprendido se guarda por (host, traffic_class): audio y video de un
+        mismo host pueden usar protocolos distintos.
+        """
+        key = (host_from_url(url), traffic_class)
+        with self._lock:
+            stats = self._hosts.setdefault(key, _HostStats())
+            available = max(1, self.max_connections - self.in_use)
+            fragments = max(1, min(self._desired_locked(stats), available))
+            self.in_use += fragments
+            chunk_size = self._chunk_locked(stats)
+        return TransferPlan(self, key, fragments, chunk_size)
+
+    def release_extra(self, plan):
+        """Devolver todas las conexiones de plan menos una (descarga sin fragmentos)"""
+        with self._lock:
+            self.in_use -= plan.reserved - 1
+            plan.reserved = 1
+
+    def finish(self, plan):
+        """Devolver las conexiones y aprender del rendimiento; devuelve bytes/s o None"""
+        with self._lock:
+            self.in_use -= plan.reserved
+            if plan.bytes <= 0 or plan.seconds <= 0:
+                return None
+            plan.throughput = throughput = plan.bytes / plan.seconds
+            stats = self._hosts.setdefault(plan.key, _HostStats())
+            stats.jobs += 1
+            stats.fragmented = plan.fragmented
+            connections = plan.fragments if plan.fragmented else 1
+            stats.per_connection = self._ewma(stats.per_connection, throughput / connections)
+            if plan.fragmented:
+                stats.throughput[plan.fragments] = self._ewma(stats.throughput.get(plan.fragments), throughput)
+            return throughput
+
+    def _ewma(self, previous, value):
+        return value if previous is None else previous + self.alpha * (value - previous)
+
+    def _desired_locked(self, stats):
+        # Descargas HTTP simples: los fragmentos paralelos no aplican
+        if stats.fragmented is False:
+            return 1
+        if not stats.throughput:
+            return self.initial_fragments
+
+        best = max(stats.throughput, key=stats.throughput.get)
+        index = self.levels.index(best) if best in self.levels else 0
+        higher = self.levels[index + 1] if index + 1 < len(self.levels) else None
+        lower = self.levels[index - 1] if index > 0 else None
+
+        # Subir mientras el nivel siguiente no se haya probado (o mejore)
+        if higher is not None and higher not in stats.throughput:
+            return higher
+        # Reexplorar cada cierto número de descargas por si cambió la red
+        if self.explore_every and stats.jobs % self.explore_every == 0:
+            return higher or lower or best
+        return best
+
+    def _chunk_locked(self, stats):
+        """Chunk que tarde unos chunk_seconds con el rendimiento por conexión observado"""
+        if not stats.per_connection:
+            return self.default_chunk
+        chunk = int(stats.per_connection * self.chunk_seconds)
+        chunk = min(self.max_chunk, max(self.min_chunk, chunk))
+        return max(self.min_chunk, chunk // MB * MB)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_connections': self.max_connections,
+                'in_use': self.in_use,
+                'hosts': {
+                    f'{host}/{traffic_class}' if traffic_class else host: {
+                        'jobs': stats.jobs,
+                        'fragmented': stats.fragmented,
+                        'per_connection_bps': round(stats.per_connection) if stats.per_connection else None,
+                        'throughput_bps': {level: round(value) for level, value in sorted(stats.throughput.items())},
+                        'next_fragments': self._desired_locked(stats),
+                        'next_chunk_size': self._chunk_locked(stats),
+                    } for (host, traffic_class), stats in self._hosts.items()
+                },
+            }
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pool de instancias YoutubeDL
+Crear un YoutubeDL repite el análisis de opciones, la carga de extractores,
+el cookie jar y los manejadores HTTP. El pool reutiliza instancias por perfil
+de opciones (análisis, audio, video) para conservar ese estado y las
+conexiones keep-alive; cada instancia la usa un solo hilo a la vez.
+"""
+
+import atexit
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import yt_dlp
+from yt_dlp.utils import DownloadCancelled, DownloadError
+
+_MISSING = object()
+
+# Selectores de formato compilados que conserva cada instancia
+SELECTOR_CACHE_SIZE = 32
+
+
+class YoutubeDLPool:
+    def __init__(self, name, base_opts, max_size=4, checkout_timeout=5, on_create=None):
+        self.name = name
+        self.base_opts = dict(base_opts)
+        self.on_create = on_create
+        self.max_size = max(1, int(max_size))
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+        self.checkouts = 0
+        self.reused = 0
+        self.overflow = 0
+        self.discarded = 0
+
+    def _new_instance(self):
+        ydl = yt_dlp.YoutubeDL(dict(self.base_opts))
+        if self.on_create:
+            self.on_create(ydl)
+        return ydl
+
+    def warm(self, count=None):
+        """Crear instancias por adelantado (hasta max_size)"""
+        count = self.max_size if count is None else min(count, self.max_size)
+        while True:
+            with self._lock:
+                if self._created >= count:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._new_instance())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _acquire(self):
+        try:
+            ydl = self._idle.get_nowait()
+            with self._lock:
+                self.reused += 1
+            return ydl, True
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._new_instance(), True
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            ydl = self._idle.get(timeout=self.checkout_timeout)
+            with self._lock:
+                self.reused += 1
+            return ydl, True
+        except queue.Empty:
+            # Pool agotado: usar una instancia temporal en lugar de bloquear la descarga
+            with self._lock:
+                self.overflow += 1
+            return self._new_instance(), False
+
+    def _discard(self, ydl, pooled):
+        try:
+            ydl.close()
+        except Exception:
+            pass
+        if pooled:
+            with self._lock:
+                self._created -= 1
+                self.discarded += 1
+
+    @staticmethod
+    def _postprocessors(ydl):
+        return [pp for pps in ydl._pps.values() for pp in pps]
+
+    @staticmethod
+    def _format_selector(ydl, format_spec):
+        """Selector compilado por ydl para format_spec (LRU propio de cada instancia)"""
+        selectors = getattr(ydl, '_pool_selectors', None)
+        if selectors is None:
+            selectors = ydl._pool_selectors = OrderedDict()
+        selector = selectors.get(format_spec)
+        if selector is None:
+            selector = selectors[format_spec] = ydl.build_format_selector(format_spec)
+            if len(selectors) > SELECTOR_CACHE_SIZE:
+                selectors.popitem(last=False)
+        else:
+            selectors.move_to_end(format_spec)
+        return selector
+
+    @contextmanager
+    def checkout(self, **overrides):
+        """Prestar una instancia aplicando opciones propias de la petición.
+
+        Las opciones se restauran al devolverla; 'progress_hooks',
+        'postprocessor_hooks', 'outtmpl' y 'format' se aplican sobre el
+        estado interno de YoutubeDL.
+        """
+        ydl, pooled = self._acquire()
+        with self._lock:
+            self.checkouts += 1
+
+        saved = {}
+        base_selector = ydl.format_selector
+        base_hooks = ydl._progress_hooks
+        base_pp_hooks = ydl._postprocessor_hooks, {pp: pp._progress_hooks for pp in self._postprocessors(ydl)}
+        try:
+            for key, value in overrides.items():
+                if key == 'progress_hooks':
+                    ydl._progress_hooks = list(value)
+                    continue
+                if key == 'postprocessor_hooks':
+                    # Los postprocesadores ya creados copiaron los hooks al registrarse
+                    ydl._postprocessor_hooks = list(value)
+                    for pp in base_pp_hooks[1]:
+                        pp._progress_hooks = list(value)
+                    continue
+                saved[key] = ydl.params.get(key, _MISSING)
+                ydl.params[key] = value
+            if 'outtmpl' in overrides:
+                ydl.params['outtmpl'] = {'default': overrides['outtmpl']}
+                ydl._parse_outtmpl()
+            if 'format' in overrides:
+                ydl.format_selector = self._format_selector(ydl, overrides['format'])
+        except Exception:
+            self._discard(ydl, pooled)
+            raise
+
+        healthy = True
+        try:
+            yield ydl
+        except (DownloadError, DownloadCancelled):
+            # Errores normales de descarga o cancelación: la instancia sigue sirviendo
+            raise
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            if not healthy:
+                self._discard(ydl, pooled)
+            else:
+                for key, value in saved.items():
+                    if value is _MISSING:
+                        ydl.params.pop(key, None)
+                    else:
+                        ydl.params[key] = value
+                ydl.format_selector = base_selector
+                ydl._progress_hooks = base_hooks
+                ydl._postprocessor_hooks = base_pp_hooks[0]
+                for pp, hooks in base_pp_hooks[1].items():
+                    pp._progress_hooks = hooks
+                ydl._num_downloads = 0
+                if pooled:
+                    self._idle.put(ydl)
+                else:
+                    ydl.close()
+
+    def close(self):
+        while True:
+            try:
+                ydl = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(ydl, True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'created': self._created,
+                'idle': self._idle.qsize(),
+                'max_size': self.max_size,
+                'checkouts': self.checkouts,
+                'reused': self.reused,
+                'overflow': self.overflow,
+                'discarded': self.discarded,
+            }
+
+
+class YoutubeDLPools:
+    """Pools por perfil de opciones"""
+
+    def __init__(self, on_create=None):
+        self._pools = {}
+        self.on_create = on_create
+        atexit.register(self.close)
+
+    def register(self, name, base_opts, max_size=4):
+        self._pools[name] = YoutubeDLPool(name, base_opts, max_size=max_size, on_create=self.on_create)
+        return self._pools[name]
+
+    def __getitem__(self, name):
+        return self._pools[name]
+
+    def warm(self):
+        for pool in self._pools.values():
+            try:
+                pool.warm(1)
+            except Exception as e:
+                print(f"⚠️  No se pudo precalentar el pool {pool.name}: {e}")
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
+
+    def stats(self):
+        return {name: pool.stats() for name, pool in self._pools.items()}
@@ -22,6 +22,8 @@ import subprocess
 import requests
 from urllib.parse import urlparse, parse_qs
 
+from extraction_cache import ytdlp_cache_dir
+
 try:
     from pytube import YouTube
     from pytube.exceptions import RegexMatchError, VideoUnavailable, LiveStreamError
@@ -236,6 +238,7 @@ def obtener_info_con_ytdlp(url):
             'ignoreerrors': False,
             'noplaylist': 'list=' not in url_procesada or url != url_procesada,  # No playlist si se modificó la URL
             'ffmpeg_location': ffmpeg_path,  # Especificar ruta de ffmpeg
+            'cachedir': ytdlp_cache_dir(),  # Caché de player/firmas compartido con el servidor
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
@@ -356,6 +359,7 @@ def descargar_audio_ytdlp(info, carpeta_destino, nombre_personalizado=None):
             'socket_timeout': 30,
             'retries': 3,
             'ffmpeg_location': ffmpeg_path,  # Especificar ruta de ffmpeg
+            'cachedir': ytdlp_cache_dir(),
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
@@ -444,6 +448,7 @@ def descargar_video_ytdlp(info, carpeta_destino, nombre_personalizado=None):
             'quiet': False,  # Mostrar progreso
             'socket_timeout': 30,
             'retries': 3,
+            'cachedir': ytdlp_cache_dir(),
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl: